@@ -37,6 +37,54 @@ module annotation_ontology_api {
     */
     funcdef get_annotation_ontology_events(GetAnnotationOntologyEventsParams params) returns (GetAnnotationOntologyEventsOutput output) authentication optional;
 	
+	typedef structure {
+		list<string> input_refs;
+		string input_workspace;
+		list<string> query_events;
+		list<string> query_genes;
+		int standardize_modelseed_ids;
+		int batch_size;
+    } GetAnnotationOntologyEventsBatchParams;
+    
+    typedef structure {
+		string input_ref;
+		list<AnnotationOntologyEvent> events;
+		mapping<string gene_id,string type> feature_types;
+		string error;
+    } AnnotationOntologyEventsResult;
+    
+    typedef structure {
+		list<AnnotationOntologyEventsResult> results;
+    } GetAnnotationOntologyEventsBatchOutput;
+    
+    /*
+        Retrieves annotation ontology events for many genomes at once, with one result (or error) per input_ref
+    */
+    funcdef get_annotation_ontology_events_batch(GetAnnotationOntologyEventsBatchParams params) returns (GetAnnotationOntologyEventsBatchOutput output) authentication optional;
+	
+	typedef structure {
+		string input_ref;
+		string input_workspace;
+		list<string> query_events;
+		list<string> query_genes;
+		string format;
+		string output_name;
+		int upload;
+    } ExportAnnotationOntologyEventsParams;
+    
+    typedef structure {
+		string file_path;
+		string format;
+		int row_count;
+		string shock_id;
+		string handle_id;
+    } ExportAnnotationOntologyEventsOutput;
+    
+    /*
+        Exports annotation ontology events as a Parquet or Arrow IPC table with one row per event, feature and term, optionally uploaded to shock
+    */
+    funcdef export_annotation_ontology_events(ExportAnnotationOntologyEventsParams params) returns (ExportAnnotationOntologyEventsOutput output) authentication optional;
+	
 	typedef structure {
 		string input_ref;
 		string input_workspace;
@@ -44,6 +92,7 @@ module annotation_ontology_api {
 		string output_workspace;
 		int clear_existing;
 		int overwrite_matching;
+		int incremental;
 		list<AnnotationOntologyEvent> events;
     } AddAnnotationOntologyEventsParams;
     
@@ -55,4 +104,38 @@ module annotation_ontology_api {
         Adds a new annotation ontology event to a genome or AMA
     */
 	funcdef add_annotation_ontology_events(AddAnnotationOntologyEventsParams params) returns (AddAnnotationOntologyEventsOutput output) authentication optional;
+	
+	typedef structure {
+		string input_ref;
+		string input_workspace;
+		string output_name;
+		int clear_existing;
+		int overwrite_matching;
+		int incremental;
+		list<AnnotationOntologyEvent> events;
+    } AddAnnotationOntologyEventsInput;
+    
+	typedef structure {
+		list<AddAnnotationOntologyEventsInput> inputs;
+		string output_workspace;
+		int batch_size;
+    } AddAnnotationOntologyEventsBatchParams;
+    
+    typedef structure {
+		string input_ref;
+		string output_ref;
+		string output_name;
+		int ftrs_found;
+		list<string> ftrs_not_found;
+		string error;
+    } AddAnnotationOntologyEventsResult;
+    
+    typedef structure {
+		list<AddAnnotationOntologyEventsResult> results;
+    } AddAnnotationOntologyEventsBatchOutput;
+    
+    /*
+        Adds annotation ontology events to many genomes or AMAs, saving them in batches with one result (or error) per input
+    */
+	funcdef add_annotation_ontology_events_batch(AddAnnotationOntologyEventsBatchParams params) returns (AddAnnotationOntologyEventsBatchOutput output) authentication optional;
 };
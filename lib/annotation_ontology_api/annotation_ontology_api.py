@@ -1,19 +1,19 @@
-import json
+import gzip
+import io
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 # silence whining
 import requests
 import hashlib
+from annotation_ontology_api.reference_data import TermMemo, get_reference_data, convert_role_to_searchrole
+from annotation_ontology_api.json_stream import JSONStream, write_json_array_gzip
+from annotation_ontology_api.shock_cache import ShockCache
+from annotation_ontology_api.feature_index import FeatureIndex, read_feature_index, write_feature_index
+from annotation_ontology_api.event_table import EVENT_TABLE_FORMATS, EventTableWriter
 requests.packages.urllib3.disable_warnings()
 
-source_hash = {
-    "MetaCyc" : "META",
-    "KEGG" : "RO",
-    "BiGG" : "BIGG",
-    "rhea" : "RHEA"
-}
-
 ontology_translation = {
     "KEGGKO" : "KO",
     "KEGGRO" : "RO",
@@ -39,13 +39,43 @@ ontology_hash = {
     "RHEA" : 1
 };
 
+#Feature fields and object paths read by get_annotation_ontology_events; sequences and everything else stay on the server
+event_feature_fields = ["id","ontology_terms","ontology_evidence"]
+event_included_paths = ["ontology_events","features_handle_ref"]
+for feature_list in ["features","cdss","mrnas","non_coding_features"]:
+    for field in event_feature_fields:
+        event_included_paths.append(feature_list+"/[*]/"+field)
+
+#Splits a RAST function into its roles
+function_split_pattern = re.compile(r"\s*;\s+|\s+[\@\/]\s+")
+sso_id_pattern = re.compile(r"^SSO:\d+$")
+#Export file names stay inside scratch: no path separators and no leading dot
+export_name_pattern = re.compile(r"^[\w-][\w.-]*\Z")
+
+def normalize_ontology_term(tag,term):
+    """Returns term in standard TAG:ID form, or None when tag is not a supported ontology"""
+    original_tag = tag
+    tag = tag.upper()
+    if tag not in ontology_hash and tag in ontology_translation:
+        tag = ontology_translation[tag]
+    if tag not in ontology_hash:
+        return None
+    array = term.split(":")
+    if len(array) == 1:
+        return tag+":"+array[0]
+    if array[0].upper() == original_tag.upper() or array[0].upper() == tag:
+        array[0] = tag
+        return ":".join(array)
+    return tag+":"+":".join(array)
+
 class AnnotationOntologyAPI:
     def __init__(self,config,ws_client = None, dfu_client = None):
         self.ws_client = ws_client
         self.dfu_client = dfu_client
-        self.alias_hash = {}
-        self.term_names = {}
         self.config = config
+        #Reference data is loaded once per process and shared by every instance
+        self.reference_data = get_reference_data(config)
+        self.term_memo_size = int(config.get("term_memo_size",0))
     
     def process_workspace_identifiers(self,id_or_ref, workspace=None):
         """
@@ -71,240 +101,313 @@ class AnnotationOntologyAPI:
         return objspec
     
     def get_alias_hash(self,namespace):
-        if "MSRXN" not in self.alias_hash:
-            filename = self.config["data_directory"]+"/msrxn_hash.json"
-            with open(filename) as json_file:
-                self.alias_hash["MSRXN"] = json.load(json_file)
-        if namespace not in self.alias_hash:
-            self.alias_hash[namespace] = {}
-            if namespace == "EC":
-                filename = self.config["data_directory"]+"/EC_translation.tsv"
-                data = ""
-                with open(filename, 'r') as file:
-                    data = file.read()
-                lines = data.split("\n")
-                lines.pop(0)
-                for line in lines:
-                    items = line.split("\t")
-                    if len(items) >= 2:
-                        modelseed = "MSRXN:"+items[0]
-                        if modelseed in self.alias_hash["MSRXN"]:
-                            modelseed = self.alias_hash["MSRXN"][modelseed][0]
-                        if items[1] not in self.alias_hash["EC"]:
-                            self.alias_hash["EC"]["EC:"+items[1]] = []
-                        self.alias_hash["EC"]["EC:"+items[1]].append(modelseed)
-            elif namespace == "META" or namespace == "RO" or namespace == "BIGG" or namespace == "RHEA":
-                filename = self.config["data_directory"]+"/ModelSEED_Reaction_Aliases.txt"
-                data = ""
-                with open(filename, 'r') as file:
-                    data = file.read()
-                lines = data.split("\n")
-                for line in lines:
-                    items = line.split("\t")
-                    if len(items) >= 3:
-                        modelseed = "MSRXN:"+items[0]
-                        if modelseed in self.alias_hash["MSRXN"]:
-                            modelseed = self.alias_hash["MSRXN"][modelseed][0]
-                        source = None
-                        if items[2] in source_hash:
-                            source = source_hash[items[2]]
-                        if source != None:
-                            if source not in self.alias_hash:
-                                self.alias_hash[source] = {}
-                            if items[1] not in self.alias_hash[source]:
-                                self.alias_hash[source][source+":"+items[1]] = []
-                            self.alias_hash[source][source+":"+items[1]].append(modelseed)
-            elif namespace == "KO":
-                filename = self.config["data_directory"]+"/kegg_95_0_ko_seed.tsv"
-                data = ""
-                with open(filename, 'r') as file:
-                    data = file.read()
-                lines = data.split("\n")
-                lines.pop(0)
-                for line in lines:
-                    items = line.split("\t")
-                    if len(items) >= 2:
-                        if items[0] not in self.alias_hash["KO"]:
-                            self.alias_hash["KO"]["KO:"+items[0]] = []
-                        modelseed_ids = items[1].split(";")
-                        id_hash = {}
-                        for modelseed in modelseed_ids:
-                            modelseed = "MSRXN:"+modelseed
-                            if modelseed in self.alias_hash["MSRXN"]:
-                                modelseed = self.alias_hash["MSRXN"][modelseed][0]
-                            if modelseed not in id_hash:
-                                self.alias_hash["KO"]["KO:"+items[0]].append(modelseed)
-                            id_hash[modelseed] = 1
-            elif namespace == "SSO":
-                sso_template = dict()
-                filename = self.config["data_directory"]+"/SSO_reactions.json"
-                with open(filename) as json_file:
-                    sso_template = json.load(json_file)
-                for sso in sso_template:
-                    id_hash = {}
-                    for modelseed in sso_template[sso]:
-                        modelseed = "MSRXN:"+modelseed
-                        if modelseed in self.alias_hash["MSRXN"]:
-                            modelseed = self.alias_hash["MSRXN"][modelseed][0]
-                        if modelseed not in id_hash:
-                            if sso not in self.alias_hash["SSO"]:
-                                self.alias_hash["SSO"][sso] = []
-                            self.alias_hash["SSO"][sso].append(modelseed)
-                        id_hash[modelseed] = 1             
-            elif namespace == "GO":
-                go_translation = dict()
-                filename = self.config["data_directory"]+"/GO_ontology_translation.json"
-                with open(filename) as json_file:
-                    go_translation = json.load(json_file)
-                for term in go_translation["translation"]:
-                    adjusted_term = "GO:"+term
-                    if "equiv_terms" in go_translation["translation"][term]:
-                        id_hash = {}
-                        for rxn_data in go_translation["translation"][term]["equiv_terms"]:
-                            if rxn_data["equiv_term"] != None:
-                                modelseed = "MSRXN:"+rxn_data["equiv_term"]
-                                if modelseed in self.alias_hash["MSRXN"]:
-                                    modelseed = self.alias_hash["MSRXN"][modelseed][0]
-                                if adjusted_term not in self.alias_hash["GO"]:
-                                    self.alias_hash["GO"][adjusted_term] = []
-                                if modelseed not in id_hash:
-                                    self.alias_hash["GO"][adjusted_term].append(modelseed)
-                                id_hash[modelseed] = 1            
-        return self.alias_hash[namespace]
+        return self.reference_data.get_alias_hash(namespace)
                 
     def translate_term_to_modelseed(self,term):
-        namespace = term.split(":").pop(0)
-        if namespace == "MSRXN":
-            if term not in self.get_alias_hash(namespace):
-                return [term]
-            else:
-                return self.get_alias_hash(namespace)[term]
-        elif term not in self.get_alias_hash(namespace):
-            return []
-        else:
-            return self.get_alias_hash(namespace)[term]
+        return self.translate_terms_to_modelseed([term])[term]
+    
+    def translate_terms_to_modelseed(self,terms):
+        """
+        Translates many normalized terms at once. Terms are deduplicated and grouped by
+        namespace so each alias table is fetched once. Returns a hash of term to its list
+        of ModelSEED IDs; lists are shared with the reference data and must not be modified.
+        """
+        namespace_terms = {}
+        for term in terms:
+            namespace = term.split(":")[0]
+            if namespace not in namespace_terms:
+                namespace_terms[namespace] = set()
+            namespace_terms[namespace].add(term)
+        output = {}
+        for namespace in namespace_terms:
+            alias_hash = self.get_alias_hash(namespace)
+            for term in namespace_terms[namespace]:
+                if term in alias_hash:
+                    output[term] = alias_hash[term]
+                elif namespace == "MSRXN":
+                    output[term] = [term]
+                else:
+                    output[term] = []
+        return output
         
+    def iterate_shock_features(self,handle_ref,fields = None):
+        """
+        Yields the features of a shock-hosted AMA feature file one at a time, decompressing
+        and parsing as it reads, so neither the decompressed file nor the whole feature list
+        is ever materialized. With fields, only those keys of each feature are kept.
+        """
+        download = lambda directory: self.dfu_client.shock_to_file({
+            "handle_id" : handle_ref,
+            "file_path" : directory
+        })["file_path"]
+        #Downloads are kept in the shock cache when enabled, and removed after reading otherwise
+        shock_cache = self.get_shock_cache()
+        if shock_cache != None:
+            raw_file = shock_cache.open(handle_ref,download)
+        else:
+            file_path = download(self.config["scratch"])
+            raw_file = open(file_path,"rb")
+        try:
+            compressed = raw_file.read(2) == b"\x1f\x8b"
+            raw_file.seek(0)
+            if compressed:
+                json_file = gzip.open(raw_file,"rt",encoding="utf-8")
+            else:
+                json_file = io.TextIOWrapper(raw_file,encoding="utf-8")
+            with raw_file, json_file:
+                for ftr in JSONStream(json_file).array_items():
+                    if fields != None:
+                        ftr = dict((field,ftr[field]) for field in fields if field in ftr)
+                    yield ftr
+        finally:
+            if shock_cache == None:
+                os.remove(file_path)
+    
+    def get_shock_cache(self):
+        max_bytes = int(self.config.get("shock_cache_size",5 << 30))
+        if max_bytes <= 0:
+            return None
+        if "shock_cache_directory" in self.config:
+            return ShockCache(self.config["shock_cache_directory"],max_bytes)
+        return ShockCache(self.config["scratch"]+"/shock_cache",max_bytes)
+    
     def get_annotation_ontology_events(self,params):
+        output = {"events" : [],"feature_types" : {}}
+        for event, ontology_terms, feature_types in self.iterate_annotation_ontology_events(params):
+            if "ontology_terms" not in event:
+                event["ontology_terms"] = {}
+                output["events"].append(event)
+            for feature_id in ontology_terms:
+                if feature_id not in event["ontology_terms"]:
+                    event["ontology_terms"][feature_id] = []
+                event["ontology_terms"][feature_id].extend(ontology_terms[feature_id])
+            output["feature_types"].update(feature_types)
+        return output
+    
+    def fetch_objects(self,inputs,included = None):
+        """
+        Fetches (input_ref, input_workspace) pairs with one get_objects2 call. Returns one
+        entry per input: the workspace object, or an error message if it could not be fetched.
+        """
+        objspecs = []
+        for (input_ref, input_workspace) in inputs:
+            objspec = self.process_workspace_identifiers(input_ref, input_workspace)
+            if included != None:
+                objspec["included"] = included
+            objspecs.append(objspec)
+        #Inaccessible objects come back as null rather than failing the whole call
+        try:
+            data = self.ws_client.get_objects2({"objects": objspecs,"ignoreErrors": 1})["data"]
+        except Exception as e:
+            return [str(e)]*len(inputs)
+        for index, (input_ref, input_workspace) in enumerate(inputs):
+            if data[index] == None:
+                data[index] = "Object "+str(input_ref)+" could not be accessed"
+        return data
+    
+    def get_annotation_ontology_events_batch(self,params):
+        """
+        Retrieves the events of many genomes, fetching them from the workspace in chunks of
+        batch_size objects per get_objects2 call. Every input_ref gets a result in input
+        order; a genome that cannot be fetched or processed carries an error instead of events.
+        """
+        batch_size = params.get("batch_size",50)
+        output = {"results" : []}
+        for chunk_start in range(0,len(params["input_refs"]),batch_size):
+            input_refs = params["input_refs"][chunk_start:chunk_start+batch_size]
+            data = self.fetch_objects([(input_ref,params.get("input_workspace")) for input_ref in input_refs],event_included_paths)
+            for index, input_ref in enumerate(input_refs):
+                result = {"input_ref" : input_ref,"events" : [],"feature_types" : {}}
+                if isinstance(data[index],str):
+                    result["error"] = data[index]
+                else:
+                    genome_params = {
+                        "object" : data[index]["data"],
+                        "type" : data[index]["info"][2],
+                        "query_events" : params.get("query_events"),
+                        "query_genes" : params.get("query_genes")
+                    }
+                    try:
+                        result.update(self.get_annotation_ontology_events(genome_params))
+                    except Exception as e:
+                        result["error"] = str(e)
+                data[index] = None
+                output["results"].append(result)
+        return output
+
+    def export_annotation_ontology_events(self,params):
+        """
+        Writes the events of a genome as a table with one row per event, feature and term,
+        as Parquet (default) or Arrow IPC in scratch, and uploads it to shock if upload is 1.
+        """
+        format = params.get("format","parquet")
+        if format not in EVENT_TABLE_FORMATS:
+            raise ValueError("Unsupported table format "+str(format)+"; use one of "+", ".join(EVENT_TABLE_FORMATS))
+        output_name = params.get("output_name","annotation_ontology_events")
+        if not isinstance(output_name,str) or export_name_pattern.match(output_name) == None:
+            raise ValueError("Invalid output_name "+repr(output_name)+": use letters, digits, '_', '-' and '.', not starting with '.'")
+        file_path = self.config["scratch"]+"/"+output_name+"."+format
+        writer = EventTableWriter(file_path,format)
+        try:
+            for event, ontology_terms, feature_types in self.iterate_annotation_ontology_events(params):
+                writer.add(event,ontology_terms,feature_types)
+            row_count = writer.close()
+        except Exception:
+            #Closing only releases the file; the error that stopped the export is the one raised
+            try:
+                writer.close()
+            except Exception:
+                pass
+            finally:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            raise
+        output = {"file_path" : file_path,"format" : format,"row_count" : row_count}
+        if params.get("upload") == 1:
+            file_to_shock = self.dfu_client.file_to_shock({'file_path': file_path, 'make_handle': 1})
+            output["shock_id"] = file_to_shock["shock_id"]
+            output["handle_id"] = file_to_shock["handle"]["hid"]
+        return output
+
+    def iterate_annotation_ontology_events(self,params,chunk_size = 5000):
+        """
+        Streams the standardized events of a genome in feature chunks so large objects never
+        need the full output in memory. Yields (event, ontology_terms, feature_types): every
+        selected event is yielded first with empty hashes, in order, and then once for each
+        chunk of features in which it has terms, with only that chunk's features.
+        """
         #Building query hash
         event_query = None
         if "query_events" in params and not params["query_events"] == None:
-            for event in params["query_events"]:
-                event_query[event] = 1
-        gene_query = None
-        if "query_genes" in params and not params["query_genes"] == None:
-            for gene in params["query_genes"]:
-                gene_query[gene] = 1
-        #Pull the object from the workspace is necessary
+            event_query = set(params["query_events"])
+        #Pull the object from the workspace is necessary, fetching only the paths read here
         if "object" not in params:
             res = None
             if "input_workspace" not in params:
-                res = self.ws_client.get_objects2({"objects": [self.process_workspace_identifiers(params["input_ref"], None)]})
+                objspec = self.process_workspace_identifiers(params["input_ref"], None)
             else: 
-                res = self.ws_client.get_objects2({"objects": [self.process_workspace_identifiers(params["input_ref"], params["input_workspace"])]})
+                objspec = self.process_workspace_identifiers(params["input_ref"], params["input_workspace"])
+            objspec["included"] = event_included_paths
+            res = self.ws_client.get_objects2({"objects": [objspec]})
             params["object"] = res["data"][0]["data"]
             params["type"] = res["data"][0]["info"][2]
-        #Get the feature data
-        features = []
-        types = {}
-        if "features" in params["object"]:
-            features.extend(params["object"]["features"])
-            for ftr in params["object"]["features"]:
-                types[ftr["id"]] = "gene"
-        if "cdss" in params["object"]:
-            features.extend(params["object"]["cdss"])
-            for ftr in params["object"]["cdss"]:
-                types[ftr["id"]] = "cds"
-        if "mrnas" in params["object"]:
-            features.extend(params["object"]["mrnas"])
-            for ftr in params["object"]["mrnas"]:
-                types[ftr["id"]] = "mrna"
-        if "non_coding_features" in params["object"]:
-            features.extend(params["object"]["non_coding_features"])
-            for ftr in params["object"]["non_coding_features"]:
-                types[ftr["id"]] = "noncoding"
-        elif "features_handle_ref" in params["object"]:
-            shock_output = self.dfu_client.shock_to_file({
-                "handle_id" : params["object"]["features_handle_ref"],
-                "file_path" : self.config["scratch"]
-            })
-            os.system("gunzip --force ".shock_output["file_path"])
-            shock_output["file_path"] = shock_output["file_path"][0:-3]
-            with open(shock_output["file_path"]) as json_file:
-                features = json.load(json_file)
-            for ftr in features:
-                types[ftr["id"]] = "gene"
-        output = {"events" : [],"feature_types" : {}}
-        if "ontology_events" in params["object"]:
-            events_array = []
-            for event in params["object"]["ontology_events"]:
-                if "event_id" not in event:
-                    event["event_id"] = event["method"]+":"+event["method_version"]+":"+event["id"]+":"+event["timestamp"]
-                old_description = None
-                if "description" in event:
-                    old_description = event["description"]
-                    if event["description"][-1*len(event["timestamp"]):] != event["timestamp"]:
-                        event["description"] = event["description"]+":"+event["timestamp"]
+        if "ontology_events" not in params["object"]:
+            return
+        events_array = []
+        selected_events = []
+        for event in params["object"]["ontology_events"]:
+            if "event_id" not in event:
+                event["event_id"] = event["method"]+":"+event["method_version"]+":"+event["id"]+":"+event["timestamp"]
+            old_description = None
+            if "description" in event:
+                old_description = event["description"]
+                if event["description"][-1*len(event["timestamp"]):] != event["timestamp"]:
+                    event["description"] = event["description"]+":"+event["timestamp"]
+            else:
+                event["description"] = event["method"]+":"+event["method_version"]+":"+event["id"]+":"+event["timestamp"]
+            newevent = {
+                "event_id" : event["event_id"],
+                "original_description" : old_description,
+                "description" : event["description"],
+                "ontology_id" : event["id"].upper(),
+                "method" : event["method"],
+                "method_version" : event["method_version"],
+                "timestamp" : event["timestamp"]
+            }
+            if newevent["ontology_id"] not in ontology_hash and newevent["ontology_id"] in ontology_translation:
+                newevent["ontology_id"] = ontology_translation[newevent["ontology_id"]]
+            events_array.append(newevent)
+            if event_query == None or newevent["event_id"] in event_query:
+                selected_events.append(len(events_array)-1)
+                yield newevent, {}, {}
+        #Filters are pushed down: no feature is read when no event is selected, and only terms
+        #of selected events are normalized and translated
+        if len(selected_events) == 0:
+            return
+        selected_indexes = None
+        if event_query != None:
+            selected_indexes = set(selected_events)
+        #Indexing the feature data in one pass; AMA features come from the shock feature file
+        feature_index = FeatureIndex()
+        feature_index.add_genome(params["object"])
+        if "non_coding_features" not in params["object"] and "features_handle_ref" in params["object"]:
+            feature_index = FeatureIndex(self.iterate_shock_features(params["object"]["features_handle_ref"],event_feature_fields))
+        #Queried genes resolve through the index rather than a scan of every feature
+        if "query_genes" in params and not params["query_genes"] == None:
+            features = feature_index.select(params["query_genes"])
+        else:
+            features = feature_index.features
+        #Terms repeat across features, so each is normalized and translated once per memo
+        term_memo = TermMemo()
+        if self.term_memo_size > 0:
+            term_memo = self.reference_data.get_term_memo(self.term_memo_size)
+        for chunk_start in range(0,len(features),chunk_size):
+            hits = 0
+            feature_terms = []
+            resolved = {}
+            memo_misses = {}
+            for feature in features[chunk_start:chunk_start+chunk_size]:
+                if "ontology_terms" in feature:
+                    for original_tag in feature["ontology_terms"]:
+                        for original_term in feature["ontology_terms"][original_tag]:
+                            if selected_indexes != None and selected_indexes.isdisjoint(feature["ontology_terms"][original_tag][original_term]):
+                                continue
+                            key = (original_tag,original_term)
+                            if key in resolved or key in memo_misses:
+                                hits += 1
+                            else:
+                                entry = term_memo.get(key)
+                                if entry == None:
+                                    memo_misses[key] = normalize_ontology_term(original_tag,original_term)
+                                else:
+                                    hits += 1
+                                    resolved[key] = entry
+                            feature_terms.append((feature,original_tag,original_term))
+            #Translating the chunk's new terms in one batch before they enter the memo
+            translations = self.translate_terms_to_modelseed(set(term for term in memo_misses.values() if term != None))
+            for key in memo_misses:
+                if memo_misses[key] == None:
+                    resolved[key] = (None,None)
                 else:
-                    event["description"] = event["method"]+":"+event["method_version"]+":"+event["id"]+":"+event["timestamp"]
-                newevent = {
-                    "event_id" : event["event_id"],
-                    "original_description" : old_description,
-                    "description" : event["description"],
-                    "ontology_id" : event["id"].upper(),
-                    "method" : event["method"],
-                    "method_version" : event["method_version"],
-                    "timestamp" : event["timestamp"],
-                    "ontology_terms" : {}
-                }
-                if newevent["ontology_id"] not in ontology_hash and newevent["ontology_id"] in ontology_translation:
-                    newevent["ontology_id"] = ontology_translation[newevent["ontology_id"]]
-                events_array.append(newevent)
-                if event_query == None or id in event_query:
-                    output["events"].append(newevent)
-            for feature in features:
-                if gene_query == None or feature["id"] in gene_query:
-                    if "ontology_terms" in feature:
-                        for tag in feature["ontology_terms"]:
-                            original_tag = tag
-                            tag = tag.upper()
-                            if tag not in ontology_hash and tag in ontology_translation:
-                                tag = ontology_translation[tag]
-                            if tag in ontology_hash:
-                                for term in feature["ontology_terms"][original_tag]:
-                                    original_term = term
-                                    array = term.split(":")
-                                    if len(array) == 1:
-                                        term = tag+":"+array[0]
-                                    else:
-                                        if array[0].upper() == original_tag.upper() or array[0].upper() == tag:
-                                            array[0] = tag
-                                            term = ":".join(array)
-                                        else:
-                                            term = tag+":"+":".join(array)
-                                    modelseed_ids = self.translate_term_to_modelseed(term)
-                                    termhash = {}
-                                    for event_index in feature["ontology_terms"][original_tag][original_term]:
-                                        if feature["id"] not in events_array[event_index]["ontology_terms"]:
-                                            output["feature_types"][feature["id"]] = types[feature["id"]]
-                                            events_array[event_index]["ontology_terms"][feature["id"]] = []
-                                        if term not in termhash:
-                                            termhash[term] = {}
-                                        termhash[term][event_index] = 1
-                                    for term in termhash:
-                                        for event_index in termhash[term]:
-                                            termdata = {"term" : term}
-                                            if len(modelseed_ids) > 0:
-                                                termdata["modelseed_ids"] = modelseed_ids
-                                            if "ontology_evidence" in feature:
-                                                if original_term in feature["ontology_evidence"]:
-                                                    if event_index in feature["ontology_evidence"][original_term]:
-                                                        termdata["evidence"] = feature["ontology_evidence"][original_term][event_index]
-                                            events_array[event_index]["ontology_terms"][feature["id"]].append(termdata)
-        return output
+                    resolved[key] = (memo_misses[key],translations[memo_misses[key]])
+                term_memo.put(key,resolved[key])
+            self.reference_data.count_term_memo(hits,len(memo_misses))
+            chunk_terms = {}
+            chunk_types = {}
+            for (feature,original_tag,original_term) in feature_terms:
+                term, modelseed_ids = resolved[(original_tag,original_term)]
+                if term == None:
+                    continue
+                termhash = {}
+                for event_index in feature["ontology_terms"][original_tag][original_term]:
+                    if selected_indexes != None and event_index not in selected_indexes:
+                        continue
+                    if event_index not in chunk_terms:
+                        chunk_terms[event_index] = {}
+                        chunk_types[event_index] = {}
+                    if feature["id"] not in chunk_terms[event_index]:
+                        chunk_types[event_index][feature["id"]] = feature_index.type(feature["id"])
+                        chunk_terms[event_index][feature["id"]] = []
+                    if term not in termhash:
+                        termhash[term] = {}
+                    termhash[term][event_index] = 1
+                for term in termhash:
+                    for event_index in termhash[term]:
+                        termdata = {"term" : term}
+                        if len(modelseed_ids) > 0:
+                            termdata["modelseed_ids"] = modelseed_ids
+                        if "ontology_evidence" in feature:
+                            if original_term in feature["ontology_evidence"]:
+                                if event_index in feature["ontology_evidence"][original_term]:
+                                    termdata["evidence"] = feature["ontology_evidence"][original_term][event_index]
+                        chunk_terms[event_index][feature["id"]].append(termdata)
+            for event_index in selected_events:
+                if event_index in chunk_terms:
+                    yield events_array[event_index], chunk_terms[event_index], chunk_types[event_index]
     
     def add_annotation_ontology_events(self,params):
         #Pull the object from the workspace is necessary
-        ref = None
+        ref = params.get("object_ref")
         if "object" not in params or params["object"] == None:
             if "input_workspace" not in params:
                 res = self.ws_client.get_objects2({"objects": [self.process_workspace_identifiers(params["input_ref"], None)]})
@@ -316,12 +419,7 @@ class AnnotationOntologyAPI:
         output = {
             "ftrs_not_found" : [],"ftrs_found" : 0
         }
-        #Pulling existing ontology so we can standardize and check for matches
-        ontologies_present = {}
-        events = self.get_annotation_ontology_events(params)["events"]
-        if "clear_existing" in params and params["clear_existing"] == 1: 
-            events = []
-        #Scrolling through new events, stadardizing, and checking for matches
+        #Scrolling through new events and stadardizing them before merging by event ID
         for event in params["events"]:
             if "ontology_id" not in event:
                 event["ontology_id"] = event["id"]
@@ -336,53 +434,75 @@ class AnnotationOntologyAPI:
                 event["description"] = event["method"]+":"+event["method_version"]+":"+event["ontology_id"]+":"+event["timestamp"]
             elif event["description"][-1*len(event["timestamp"]):] != event["timestamp"]:
                 event["description"] = event["description"]+":"+event["timestamp"]
-            index = 0
-            match = 0
-            for existing_event in events:
-                #If an existing event has a matching event ID, we overwrite it
-                if existing_event["event_id"] == event["event_id"]:
-                    match = 1
-                    if "overwrite_matching" in params and params["overwrite_matching"] == 1:
-                        events[index] = event
-                index += 1
-            if match == 0:
-                events.append(event)
-        #Filling feature hash with all feature types which should all have unique ids
-        alias_hash = {}
+        #Incremental mode appends the new events and touches only the features they name. Clearing
+        #or overwriting existing events moves terms all over the genome, and a genome this API has
+        #not upgraded yet needs every feature upgraded, so those take a full rebuild
+        overwrite_matching = "overwrite_matching" in params and params["overwrite_matching"] == 1
+        incremental = False
+        if "incremental" in params and params["incremental"] == 1 and not ("clear_existing" in params and params["clear_existing"] == 1):
+            existing_ids = set(self.get_event_id(event) for event in params["object"].get("ontology_events",[]))
+            incremental = not overwrite_matching or all(event["event_id"] not in existing_ids for event in params["events"])
+            incremental = incremental and self.genome_upgraded(params["object"])
+        #Aliases of a stored object version never change, so its index is reused when cached
+        alias_hash = self.read_alias_index(ref)
+        index_aliases = alias_hash == None
+        if index_aliases:
+            alias_hash = {}
         feature_hash = {}
         feature_types = ["features","cdss","mrnas","non_coding_features"]
-        for currtype in feature_types:
-            if currtype in params["object"]:
-                to_remove = []
-                for ftr in params["object"][currtype]: 
-                    ftr["ontology_terms"] = {}
-                    if currtype == "features" and "protein_translation" not in ftr:
-                        if "non_coding_features" not in params["object"]:
-                            params["object"]["non_coding_features"] = []
-                        params["object"]["non_coding_features"].append(ftr)
-                        to_remove.append(ftr)
-                    else:
-                        self.upgrade_feature(ftr,currtype)
-                        feature_hash[ftr["id"]] = ftr
-                        self.process_feature_aliases(ftr,alias_hash)
-                for item in to_remove:
-                    params["object"][currtype].remove(item)
+        if incremental:
+            events = self.merge_events([],[event for event in params["events"] if event["event_id"] not in existing_ids])
+            ontologies_present = params["object"].get("ontologies_present",{})
+            for currtype in feature_types:
+                for ftr in params["object"].get(currtype,[]):
+                    feature_hash[ftr["id"]] = ftr
+        else:
+            #Pulling existing ontology so we can standardize and merge
+            ontologies_present = {}
+            events = self.get_annotation_ontology_events(params)["events"]
+            if "clear_existing" in params and params["clear_existing"] == 1: 
+                events = []
+            events = self.merge_events(events,params["events"],overwrite_matching)
+            params["object"]["ontology_events"] = []
+            #Filling feature hash with all feature types which should all have unique ids
+            for currtype in feature_types:
+                if currtype in params["object"]:
+                    to_remove = []
+                    for ftr in params["object"][currtype]: 
+                        ftr["ontology_terms"] = {}
+                        if currtype == "features" and "protein_translation" not in ftr:
+                            if "non_coding_features" not in params["object"]:
+                                params["object"]["non_coding_features"] = []
+                            params["object"]["non_coding_features"].append(ftr)
+                            to_remove.append(ftr)
+                        else:
+                            self.upgrade_feature(ftr,currtype)
+                            feature_hash[ftr["id"]] = ftr
+                            if index_aliases:
+                                self.process_feature_aliases(ftr,alias_hash)
+                    for item in to_remove:
+                        params["object"][currtype].remove(item)
         if "features_handle_ref" in params["object"]:
             if "feature_object" not in params:
-                shock_output = self.dfu_client.shock_to_file({
-                    "handle_id" : params["object"]["features_handle_ref"],
-                    "file_path" : self.config["scratch"]
-                })
-                os.system("gunzip --force ".shock_output["file_path"])
-                shock_output["file_path"] = shock_output["file_path"][0:-3]
-                with open(shock_output["file_path"]) as json_file:
-                    params["feature_object"] = json.load(json_file)
+                params["feature_object"] = list(self.iterate_shock_features(params["object"]["features_handle_ref"]))
         if "feature_object" in params:
             for ftr in params["feature_object"]:
                 feature_hash[ftr["id"]] = ftr
-                self.process_feature_aliases(ftr,alias_hash)
+                if index_aliases and not incremental:
+                    self.process_feature_aliases(ftr,alias_hash)
+        #Aliases are only gathered in incremental mode when a new event names a gene by alias
+        if index_aliases and incremental:
+            if any(gene not in feature_hash for event in events for gene in event["ontology_terms"]):
+                for currtype in feature_types:
+                    for ftr in params["object"].get(currtype,[]):
+                        self.process_feature_aliases(ftr,alias_hash)
+                for ftr in params.get("feature_object",[]):
+                    self.process_feature_aliases(ftr,alias_hash)
+            else:
+                index_aliases = False
+        if index_aliases:
+            self.write_alias_index(ref,alias_hash)
         #Adding events
-        params["object"]["ontology_events"] = []
         for event in events:
             new_event = {
                 "description" : event["description"],
@@ -418,9 +538,10 @@ class AnnotationOntologyAPI:
                             if term["term"].split(":")[0] != new_event["id"]:
                                 term["term"] = new_event["id"]+":"+term["term"]
                             #If this is a SEED role, translate to an SSO
-                            if new_event["id"] == "SSO" and re.search('^SSO:\d+$', term["term"]) == None:
-                                term["term"] = re.sub("^SSO:","",term["term"])
-                                terms = re.split("\s*;\s+|\s+[\@\/]\s+",term["term"])
+                            if new_event["id"] == "SSO" and sso_id_pattern.search(term["term"]) == None:
+                                if term["term"].startswith("SSO:"):
+                                    term["term"] = term["term"][4:]
+                                terms = function_split_pattern.split(term["term"])
                                 first = 1
                                 for subterm in terms:
                                     if first == 1:
@@ -454,47 +575,10 @@ class AnnotationOntologyAPI:
         params["object"]["ontologies_present"] = ontologies_present
         #Saving object if requested but not if it's an AMA
         if params["save"] == 1:
-            #Setting provenance
-            provenance_params = {}
-            for key in params:
-                if not key == "object" and not key == "events" and not "feature_object":
-                    provenance_params[key] = params[key]            
-            provenance = [{
-                'description': 'A function that adds ontology terms to a genome or metagenome',
-                'input_ws_objects': [],
-                'method': 'add_annotation_ontology_events',
-                'method_params': [provenance_params],
-                'service': 'annotation_ontology_api',
-                'service_ver': 1,
-            }]
-            #If a metagenome, saving features
-            params["type"] = "KBaseGenomes.Genome"
-            if "feature_object" in params:
-                params["type"] = "KBaseMetagenomes.AnnotatedMetagenomeAssembly"
-                json_file_path = self.config["scratch"]+params["object"]["name"]+"_features.json"
-                with open(json_file_path, 'w') as fid:
-                    json.dump(params["feature_object"], fid)
-                json_to_shock = self.dfu_client.file_to_shock(
-                    {'file_path': json_file_path, 'make_handle': 1, 'pack': 'gzip'}
-                )
-                # Resetting feature file handle o new value
-                params["object"]['features_handle_ref'] = json_to_shock['handle']['hid']
-                # Remove json file to avoid disk overload
-                os.remove(json_file_path)
-            # Removing genbank handle ref because this breaks saving
-            params["object"].pop('genbank_handle_ref', None)
-            #Adding missing fields in genome
-            if params["type"] == "KBaseGenomes.Genome":
-                self.check_genome(params["object"],ref)
             # Saving genome/metagenome object to workspace
             ws_params = {
                 'workspace': params["output_workspace"],
-                'objects': [{
-                    'data': params["object"],
-                    'name': params["output_name"],
-                    'type': params["type"],
-                    'provenance': provenance
-                }]
+                'objects': [self.build_save_object(params,ref)]
             }
             save_output = self.ws_client.save_objects(ws_params)
             output["output_ref"] = str(save_output[0][6])+"/"+str(save_output[0][0])+"/"+str(save_output[0][4])
@@ -507,6 +591,183 @@ class AnnotationOntologyAPI:
                 output["feature_object"] = params["feature_object"]
         return output
     
+    def feature_index_directory(self):
+        #The alias index cache is disabled by a feature_index_size of 0
+        if self.feature_index_size() <= 0:
+            return None
+        if "feature_index_directory" in self.config:
+            return self.config["feature_index_directory"]
+        if "scratch" in self.config:
+            return self.config["scratch"]+"/feature_index"
+        return None
+    
+    def feature_index_size(self):
+        return int(self.config.get("feature_index_size",1 << 30))
+    
+    def read_alias_index(self,ref):
+        if ref == None or self.feature_index_directory() == None:
+            return None
+        return read_feature_index(self.feature_index_directory(),ref)
+    
+    def write_alias_index(self,ref,alias_hash):
+        if ref != None and self.feature_index_directory() != None:
+            write_feature_index(self.feature_index_directory(),ref,alias_hash,max_bytes=self.feature_index_size())
+    
+    def get_event_id(self,event):
+        if "event_id" in event:
+            return event["event_id"]
+        return event["method"]+":"+event["method_version"]+":"+event["id"]+":"+event["timestamp"]
+    
+    def merge_events(self,events,new_events,overwrite_matching = False):
+        """
+        Merges new events into existing events by event_id, in order. A new event whose id is
+        already present is dropped, or with overwrite_matching replaces the first event with
+        that id in place, removing any later duplicates of it. Other events keep their order
+        and unmatched new events are appended.
+        """
+        event_indexes = {}
+        for index, event in enumerate(events):
+            if event["event_id"] not in event_indexes:
+                event_indexes[event["event_id"]] = []
+            event_indexes[event["event_id"]].append(index)
+        removed = set()
+        for event in new_events:
+            if event["event_id"] not in event_indexes:
+                event_indexes[event["event_id"]] = [len(events)]
+                events.append(event)
+            elif overwrite_matching:
+                indexes = event_indexes[event["event_id"]]
+                events[indexes[0]] = event
+                removed.update(indexes[1:])
+                event_indexes[event["event_id"]] = indexes[0:1]
+        if len(removed) > 0:
+            events = [event for index, event in enumerate(events) if index not in removed]
+        return events
+    
+    def add_annotation_ontology_events_batch(self,params):
+        """
+        Adds events to many genomes or AMAs and saves them all to output_workspace. Inputs
+        are fetched batch_size at a time, the next batch in the background while the current
+        one is transformed, and each batch is saved with one save_objects call. Every input
+        gets a result in input order with its output_ref or an error.
+        """
+        batch_size = params.get("batch_size",10)
+        chunks = []
+        for chunk_start in range(0,len(params["inputs"]),batch_size):
+            chunks.append(params["inputs"][chunk_start:chunk_start+batch_size])
+        output = {"results" : []}
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            fetched = None
+            if len(chunks) > 0:
+                fetched = executor.submit(self.fetch_objects,[(item["input_ref"],item.get("input_workspace")) for item in chunks[0]])
+            for chunk_index, chunk in enumerate(chunks):
+                data = fetched.result()
+                if chunk_index+1 < len(chunks):
+                    fetched = executor.submit(self.fetch_objects,[(item["input_ref"],item.get("input_workspace")) for item in chunks[chunk_index+1]])
+                results = []
+                save_objects = []
+                for index, item in enumerate(chunk):
+                    result = {"input_ref" : item["input_ref"]}
+                    results.append(result)
+                    if isinstance(data[index],str):
+                        result["error"] = data[index]
+                        continue
+                    info = data[index]["info"]
+                    item_params = dict(item)
+                    item_params.update({
+                        "object" : data[index]["data"],
+                        "type" : info[2],
+                        "object_ref" : str(info[6])+"/"+str(info[0])+"/"+str(info[4]),
+                        "output_workspace" : params["output_workspace"],
+                        "save" : 0
+                    })
+                    data[index] = None
+                    try:
+                        add_output = self.add_annotation_ontology_events(item_params)
+                        result["ftrs_found"] = add_output["ftrs_found"]
+                        result["ftrs_not_found"] = add_output["ftrs_not_found"]
+                        save_objects.append((result,self.build_save_object(item_params,item_params["object_ref"])))
+                    except Exception as e:
+                        result["error"] = str(e)
+                self.save_objects_batch(params["output_workspace"],save_objects)
+                output["results"].extend(results)
+        finally:
+            executor.shutdown()
+        return output
+    
+    def save_objects_batch(self,workspace,save_objects):
+        """
+        Saves (result, object save data) pairs with one save_objects call, recording each
+        output_ref or error in its result. If the batch is rejected, objects are saved one
+        at a time so the failure is attributed to the objects that caused it.
+        """
+        if len(save_objects) == 0:
+            return
+        try:
+            infos = self.ws_client.save_objects({
+                'workspace': workspace,
+                'objects': [item[1] for item in save_objects]
+            })
+        except Exception as e:
+            if len(save_objects) == 1:
+                save_objects[0][0]["error"] = str(e)
+                return
+            for item in save_objects:
+                self.save_objects_batch(workspace,[item])
+            return
+        for index, info in enumerate(infos):
+            save_objects[index][0]["output_ref"] = str(info[6])+"/"+str(info[0])+"/"+str(info[4])
+            save_objects[index][0]["output_name"] = str(info[1])
+    
+    def build_save_object(self,params,ref = None):
+        """
+        Returns the save_objects entry for a genome or AMA processed by
+        add_annotation_ontology_events, uploading the AMA features file first
+        """
+        #Setting provenance
+        provenance_params = {}
+        for key in params:
+            if not key == "object" and not key == "events" and not "feature_object":
+                provenance_params[key] = params[key]            
+        provenance = [{
+            'description': 'A function that adds ontology terms to a genome or metagenome',
+            'input_ws_objects': [],
+            'method': 'add_annotation_ontology_events',
+            'method_params': [provenance_params],
+            'service': 'annotation_ontology_api',
+            'service_ver': 1,
+        }]
+        #If a metagenome, saving features
+        params["type"] = "KBaseGenomes.Genome"
+        if "feature_object" in params:
+            params["type"] = "KBaseMetagenomes.AnnotatedMetagenomeAssembly"
+            #Features are compressed as they are serialized and uploaded already packed
+            json_file_path = self.config["scratch"]+params["object"]["name"]+"_features.json.gz"
+            md5 = write_json_array_gzip(json_file_path,params["feature_object"],int(self.config.get("feature_compression_level",6)))
+            json_to_shock = self.dfu_client.file_to_shock(
+                {'file_path': json_file_path, 'make_handle': 1}
+            )
+            remote_md5 = json_to_shock['handle'].get('remote_md5')
+            if remote_md5 != None and remote_md5 != md5:
+                os.remove(json_file_path)
+                raise ValueError("Checksum mismatch uploading "+json_file_path+": wrote "+md5+", shock has "+remote_md5)
+            # Resetting feature file handle o new value
+            params["object"]['features_handle_ref'] = json_to_shock['handle']['hid']
+            # Remove json file to avoid disk overload
+            os.remove(json_file_path)
+        # Removing genbank handle ref because this breaks saving
+        params["object"].pop('genbank_handle_ref', None)
+        #Adding missing fields in genome
+        if params["type"] == "KBaseGenomes.Genome":
+            self.check_genome(params["object"],ref)
+        return {
+            'data': params["object"],
+            'name': params["output_name"],
+            'type': params["type"],
+            'provenance': provenance
+        }
+    
     def process_feature_aliases(self,ftr,alias_hash):
         if "aliases" in ftr:
             for alias in ftr["aliases"]:    
@@ -521,9 +782,30 @@ class AnnotationOntologyAPI:
                     alias_hash[alias[1]] = []
                     alias_hash[alias[1]].append(ftr["id"])
     
+    def genome_upgraded(self,genome):
+        """Returns True if a full rebuild would leave every feature of genome as it is"""
+        for currtype in ["features","cdss","mrnas","non_coding_features"]:
+            for ftr in genome.get(currtype,[]):
+                if not self.feature_upgraded(ftr,currtype):
+                    return False
+        return True
+    
+    def feature_upgraded(self,ftr,type):
+        #Mirrors upgrade_feature, plus the move of features without a translation to non_coding_features
+        if "function" in ftr or "dna_sequence_length" not in ftr or "md5" not in ftr:
+            return False
+        if type == "features" and ("cdss" not in ftr or "protein_translation" not in ftr):
+            return False
+        if type == "cdss" and "protein_md5" not in ftr:
+            return False
+        for alias in ftr.get("aliases",[]):
+            if isinstance(alias, str):
+                return False
+        return True
+    
     def upgrade_feature(self,ftr,type):
         if "function" in ftr:
-            ftr["functions"] = re.split("\s*;\s+|\s+[\@\/]\s+",ftr["function"])
+            ftr["functions"] = function_split_pattern.split(ftr["function"])
             del ftr["function"]
             #Clearing old ontology terms rather than attempting to translate them
             ftr["ontology_terms"] = {}
@@ -570,43 +852,22 @@ class AnnotationOntologyAPI:
             genome["assembly_ref"] = ref+";"+genome["assembly_ref"]
         
     def convert_role_to_searchrole(self,term):
-        term = term.lower()
-        term = re.sub("\s","",term)
-        term = re.sub("[\d\-]+\.[\d\-]+\.[\d\-]+\.[\d\-]*","",term)
-        term = re.sub("\#.*$","",term)
-        term = re.sub("\(ec:*\)","",term)
-        term = re.sub("[\(\)\[\],-]","",term)
-        return term
+        return convert_role_to_searchrole(term)
     
     def translate_rast_function_to_sso(self,term):
         #Stripping out SSO prefix if it's present
-        term = re.sub("^SSO:","",term)
-        term = self.convert_role_to_searchrole(term)
-        #Checking for SSO translation file
-        if "SEED_ROLE" not in self.alias_hash:
-            self.alias_hash["SEED_ROLE"] = {}
-            sso_ontology = dict()
-            with open(self.config["data_directory"]+"/SSO_dictionary.json") as json_file:
-                sso_ontology = json.load(json_file)
-            for term in sso_ontology["term_hash"]:
-                name = self.convert_role_to_searchrole(sso_ontology["term_hash"][term]["name"])
-                self.alias_hash["SEED_ROLE"][name] = term
-            
-        #Translating
-        if term in self.alias_hash["SEED_ROLE"]:
-            return self.alias_hash["SEED_ROLE"][term]
+        if term.startswith("SSO:"):
+            term = term[4:]
+        term = convert_role_to_searchrole(term)
+        #Translating against the prebuilt search role index
+        seed_roles = self.reference_data.get_seed_roles()
+        if term in seed_roles:
+            return seed_roles[term]
         else:
             return None
     
     def get_term_name(self,type,term):
-        if type not in self.term_names:
-            self.term_names[type] = {}
-            if type == "SSO" or type == "EC" or type == "TC" or type == "META" or type == "RO" or type == "KO" or type == "GO":
-                with open(self.config["data_directory"]+"/"+type+"_dictionary.json") as json_file:
-                    ontology = json.load(json_file)
-                    for term in ontology["term_hash"]:
-                        self.term_names[type][term] = ontology["term_hash"][term]["name"]
-        if term not in self.term_names[type]:
-            return "Unknown"
-        return self.term_names[type][term]
-        
\ No newline at end of file
+        return self.reference_data.get_term_names(type).get(term,"Unknown")
+    
+    def get_term_synonyms(self,type,term):
+        return self.reference_data.get_term_synonyms(type).get(term,[])
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+############################################################
+#
+# Asyncio counterpart of annotation_ontology_apiClient. Not generated by the
+# KBase type compiler; keep its methods in step with the spec by hand.
+#
+############################################################
+
+try:
+    from .asyncclient import AsyncBaseClient as _AsyncBaseClient
+except ImportError:
+    from asyncclient import AsyncBaseClient as _AsyncBaseClient
+
+
+class annotation_ontology_api(object):
+    '''
+    Every method is a coroutine with the parameters and result of the
+    method of the same name in annotation_ontology_apiClient. Calls share
+    one pool of at most max_connections keep-alive connections; use the
+    client as "async with" or await close() to release them.
+    '''
+
+    def __init__(
+            self, url=None, timeout=30 * 60, token=None,
+            max_connections=100, max_retries=3, backoff=0.5,
+            trust_all_ssl_certificates=False):
+        self._service_ver = None
+        self._client = _AsyncBaseClient(
+            url, timeout=timeout, token=token,
+            max_connections=max_connections, max_retries=max_retries,
+            backoff=backoff,
+            trust_all_ssl_certificates=trust_all_ssl_certificates)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await self._client.close()
+
+    async def get_annotation_ontology_events(self, params, context=None):
+        return await self._client.call_method(
+            'annotation_ontology_api.get_annotation_ontology_events',
+            [params], self._service_ver, context)
+
+    async def get_annotation_ontology_events_batch(self, params, context=None):
+        return await self._client.call_method(
+            'annotation_ontology_api.get_annotation_ontology_events_batch',
+            [params], self._service_ver, context)
+
+    async def export_annotation_ontology_events(self, params, context=None):
+        return await self._client.call_method(
+            'annotation_ontology_api.export_annotation_ontology_events',
+            [params], self._service_ver, context)
+
+    async def add_annotation_ontology_events(self, params, context=None):
+        return await self._client.call_method(
+            'annotation_ontology_api.add_annotation_ontology_events',
+            [params], self._service_ver, context)
+
+    async def add_annotation_ontology_events_batch(self, params, context=None):
+        return await self._client.call_method(
+            'annotation_ontology_api.add_annotation_ontology_events_batch',
+            [params], self._service_ver, context)
+
+    async def status(self, context=None):
+        return await self._client.call_method(
+            'annotation_ontology_api.status',
+            [], self._service_ver, context)
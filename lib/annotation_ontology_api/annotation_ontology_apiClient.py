@@ -55,20 +55,69 @@ class annotation_ontology_api(object):
             'annotation_ontology_api.get_annotation_ontology_events',
             [params], self._service_ver, context)
 
+    def get_annotation_ontology_events_batch(self, params, context=None):
+        """
+        Retrieves annotation ontology events for many genomes at once, with one result (or error) per input_ref
+        :param params: instance of type
+           "GetAnnotationOntologyEventsBatchParams" -> structure: parameter
+           "input_refs" of list of String, parameter "input_workspace" of
+           String, parameter "query_events" of list of String, parameter
+           "query_genes" of list of String, parameter
+           "standardize_modelseed_ids" of Long, parameter "batch_size" of Long
+        :returns: instance of type "GetAnnotationOntologyEventsBatchOutput"
+           -> structure: parameter "results" of list of type
+           "AnnotationOntologyEventsResult" -> structure: parameter
+           "input_ref" of String, parameter "events" of list of type
+           "AnnotationOntologyEvent" -> structure: parameter "event_id" of
+           String, parameter "description" of String, parameter
+           "ontology_id" of String, parameter "method" of String, parameter
+           "method_version" of String, parameter "timestamp" of String,
+           parameter "feature_types" of mapping from String to String,
+           parameter "ontology_terms" of mapping from String to list of type
+           "AnnotationOntologyTerm" -> structure: parameter "term" of
+           String, parameter "modelseed_ids" of list of String, parameter
+           "evidence" of String, parameter "feature_types" of mapping from
+           String to String, parameter "error" of String
+        """
+        return self._client.call_method(
+            'annotation_ontology_api.get_annotation_ontology_events_batch',
+            [params], self._service_ver, context)
+
+    def export_annotation_ontology_events(self, params, context=None):
+        """
+        Exports annotation ontology events as a Parquet or Arrow IPC table with one row per event, feature and term, optionally uploaded to shock
+        :param params: instance of type
+           "ExportAnnotationOntologyEventsParams" -> structure: parameter
+           "input_ref" of String, parameter "input_workspace" of String,
+           parameter "query_events" of list of String, parameter
+           "query_genes" of list of String, parameter "format" of String,
+           parameter "output_name" of String, parameter "upload" of Long
+        :returns: instance of type "ExportAnnotationOntologyEventsOutput"
+           -> structure: parameter "file_path" of String, parameter "format"
+           of String, parameter "row_count" of Long, parameter "shock_id" of
+           String, parameter "handle_id" of String
+        """
+        return self._client.call_method(
+            'annotation_ontology_api.export_annotation_ontology_events',
+            [params], self._service_ver, context)
+
     def add_annotation_ontology_events(self, params, context=None):
         """
         Adds a new annotation ontology event to a genome or AMA
         :param params: instance of type "AddAnnotationOntologyEventsParams"
            -> structure: parameter "input_ref" of String, parameter
            "input_workspace" of String, parameter "output_name" of String,
-           parameter "output_workspace" of String, parameter "events" of list
-           of type "AnnotationOntologyEvent" -> structure: parameter
-           "event_id" of String, parameter "ontology_id" of String, parameter
-           "method" of String, parameter "method_version" of String,
-           parameter "timestamp" of String, parameter "ontology_terms" of
-           mapping from String to list of type "AnnotationOntologyTerm"
-           (Insert your typespec information here.) -> structure: parameter
-           "term" of String, parameter "modelseed_id" of String, parameter
+           parameter "output_workspace" of String, parameter
+           "clear_existing" of Long, parameter "overwrite_matching" of Long,
+           parameter "incremental" of Long, parameter "events" of list of
+           type "AnnotationOntologyEvent" -> structure: parameter "event_id"
+           of String, parameter "description" of String, parameter
+           "ontology_id" of String, parameter "method" of String, parameter
+           "method_version" of String, parameter "timestamp" of String,
+           parameter "feature_types" of mapping from String to String,
+           parameter "ontology_terms" of mapping from String to list of type
+           "AnnotationOntologyTerm" -> structure: parameter "term" of
+           String, parameter "modelseed_ids" of list of String, parameter
            "evidence" of String
         :returns: instance of type "AddAnnotationOntologyEventsOutput" ->
            structure: parameter "output_ref" of String
@@ -77,6 +126,39 @@ class annotation_ontology_api(object):
             'annotation_ontology_api.add_annotation_ontology_events',
             [params], self._service_ver, context)
 
+    def add_annotation_ontology_events_batch(self, params, context=None):
+        """
+        Adds annotation ontology events to many genomes or AMAs, saving them in batches with one result (or error) per input
+        :param params: instance of type
+           "AddAnnotationOntologyEventsBatchParams" -> structure: parameter
+           "inputs" of list of type "AddAnnotationOntologyEventsInput" ->
+           structure: parameter "input_ref" of String, parameter
+           "input_workspace" of String, parameter "output_name" of String,
+           parameter "clear_existing" of Long, parameter
+           "overwrite_matching" of Long, parameter "incremental" of Long,
+           parameter "events" of list of type "AnnotationOntologyEvent" ->
+           structure: parameter "event_id" of String, parameter
+           "description" of String, parameter "ontology_id" of String,
+           parameter "method" of String, parameter "method_version" of
+           String, parameter "timestamp" of String, parameter
+           "feature_types" of mapping from String to String, parameter
+           "ontology_terms" of mapping from String to list of type
+           "AnnotationOntologyTerm" -> structure: parameter "term" of
+           String, parameter "modelseed_ids" of list of String, parameter
+           "evidence" of String, parameter "output_workspace" of String,
+           parameter "batch_size" of Long
+        :returns: instance of type "AddAnnotationOntologyEventsBatchOutput"
+           -> structure: parameter "results" of list of type
+           "AddAnnotationOntologyEventsResult" -> structure: parameter
+           "input_ref" of String, parameter "output_ref" of String,
+           parameter "output_name" of String, parameter "ftrs_found" of Long,
+           parameter "ftrs_not_found" of list of String, parameter "error" of
+           String
+        """
+        return self._client.call_method(
+            'annotation_ontology_api.add_annotation_ontology_events_batch',
+            [params], self._service_ver, context)
+
     def status(self, context=None):
         return self._client.call_method('annotation_ontology_api.status',
                                         [], self._service_ver, context)
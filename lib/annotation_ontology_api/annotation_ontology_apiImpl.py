@@ -4,8 +4,12 @@ import os
 import requests
 from pprint import pformat
 from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+from annotation_ontology_api.reference_data import get_reference_data
 from Workspace.WorkspaceClient import Workspace as workspaceService
 from DataFileUtil.DataFileUtilClient import DataFileUtil
+import Workspace.baseclient
+import DataFileUtil.baseclient
+from annotation_ontology_api import http_transport
 # silence whining
 import requests
 requests.packages.urllib3.disable_warnings()
@@ -32,6 +36,24 @@ class annotation_ontology_api:
     GIT_COMMIT_HASH = ""
 
     #BEGIN_CLASS_HEADER
+    def build_api(self, ctx, params):
+        if self.ws_client == None:
+            if "workspace-url" in params:
+                return AnnotationOntologyAPI(self.config,workspaceService(params['workspace-url'], token=ctx['token']),self.dfu_client)
+            return AnnotationOntologyAPI(self.config,workspaceService(self.config['workspace-url'], token=ctx['token']),self.dfu_client)
+        return AnnotationOntologyAPI(self.config,self.ws_client,self.dfu_client)
+
+    def iterate_annotation_ontology_events(self, ctx, params):
+        """
+        Streaming form of get_annotation_ontology_events, served as JSON lines when the
+        client sends "Accept: application/x-ndjson". Each line holds an event and the terms
+        of one chunk of its features; every event first appears once with no terms.
+        """
+        self.config['ctx'] = ctx
+        anno_api = self.build_api(ctx, params)
+        chunk_size = params.get("chunk_size", 5000)
+        for event, ontology_terms, feature_types in anno_api.iterate_annotation_ontology_events(params, chunk_size):
+            yield {"event" : event, "ontology_terms" : ontology_terms, "feature_types" : feature_types}
     #END_CLASS_HEADER
 
     # config contains contents of config file in a hash or None if it couldn't
@@ -46,6 +68,14 @@ class annotation_ontology_api:
             self.dfu_client = DataFileUtil(self.config['SDK_CALLBACK_URL'])
             self.config['KB_AUTH_TOKEN'] = os.environ['KB_AUTH_TOKEN']
             self.ws_client = workspaceService(config["workspace-url"])
+        #Workspace and DataFileUtil calls share pooled keep-alive connections
+        if "http_pool_size" in self.config or "http_max_per_host" in self.config:
+            http_transport.configure_transport(self.config.get("http_pool_size"), self.config.get("http_max_per_host"))
+        for baseclient in [Workspace.baseclient, DataFileUtil.baseclient]:
+            http_transport.use_pooled_transport(baseclient)
+        #Loading shared reference data before any request arrives (and before uwsgi forks)
+        if self.config.get("preload_reference_data") == "1":
+            get_reference_data(self.config).warm()
         #END_CONSTRUCTOR
         pass
 
@@ -73,14 +103,7 @@ class annotation_ontology_api:
         #BEGIN get_annotation_ontology_events
         self.config['ctx'] = ctx
         #print(("Input parameters: " + pformat(params)))
-        anno_api = None
-        if self.ws_client == None:
-            if "workspace-url" in params:
-                anno_api = AnnotationOntologyAPI(self.config,workspaceService(params['workspace-url'], token=ctx['token']),self.dfu_client)
-            else:
-                anno_api = AnnotationOntologyAPI(self.config,workspaceService(self.config['workspace-url'], token=ctx['token']),self.dfu_client)
-        else:
-            anno_api = AnnotationOntologyAPI(self.config,self.ws_client,self.dfu_client)
+        anno_api = self.build_api(ctx, params)
         output = anno_api.get_annotation_ontology_events(params)
         #END get_annotation_ontology_events
 
@@ -91,20 +114,91 @@ class annotation_ontology_api:
         # return the results
         return [output]
 
+    def get_annotation_ontology_events_batch(self, ctx, params):
+        """
+        Retrieves annotation ontology events for many genomes at once, with one result (or error) per input_ref
+        :param params: instance of type
+           "GetAnnotationOntologyEventsBatchParams" -> structure: parameter
+           "input_refs" of list of String, parameter "input_workspace" of
+           String, parameter "query_events" of list of String, parameter
+           "query_genes" of list of String, parameter
+           "standardize_modelseed_ids" of Long, parameter "batch_size" of Long
+        :returns: instance of type "GetAnnotationOntologyEventsBatchOutput"
+           -> structure: parameter "results" of list of type
+           "AnnotationOntologyEventsResult" -> structure: parameter
+           "input_ref" of String, parameter "events" of list of type
+           "AnnotationOntologyEvent" -> structure: parameter "event_id" of
+           String, parameter "description" of String, parameter
+           "ontology_id" of String, parameter "method" of String, parameter
+           "method_version" of String, parameter "timestamp" of String,
+           parameter "feature_types" of mapping from String to String,
+           parameter "ontology_terms" of mapping from String to list of type
+           "AnnotationOntologyTerm" -> structure: parameter "term" of
+           String, parameter "modelseed_ids" of list of String, parameter
+           "evidence" of String, parameter "feature_types" of mapping from
+           String to String, parameter "error" of String
+        """
+        # ctx is the context object
+        # return variables are: output
+        #BEGIN get_annotation_ontology_events_batch
+        self.config['ctx'] = ctx
+        anno_api = self.build_api(ctx, params)
+        output = anno_api.get_annotation_ontology_events_batch(params)
+        #END get_annotation_ontology_events_batch
+
+        # At some point might do deeper type checking...
+        if not isinstance(output, dict):
+            raise ValueError('Method get_annotation_ontology_events_batch return value ' +
+                             'output is not type dict as required.')
+        # return the results
+        return [output]
+
+    def export_annotation_ontology_events(self, ctx, params):
+        """
+        Exports annotation ontology events as a Parquet or Arrow IPC table with one row per event, feature and term, optionally uploaded to shock
+        :param params: instance of type
+           "ExportAnnotationOntologyEventsParams" -> structure: parameter
+           "input_ref" of String, parameter "input_workspace" of String,
+           parameter "query_events" of list of String, parameter
+           "query_genes" of list of String, parameter "format" of String,
+           parameter "output_name" of String, parameter "upload" of Long
+        :returns: instance of type "ExportAnnotationOntologyEventsOutput"
+           -> structure: parameter "file_path" of String, parameter "format"
+           of String, parameter "row_count" of Long, parameter "shock_id" of
+           String, parameter "handle_id" of String
+        """
+        # ctx is the context object
+        # return variables are: output
+        #BEGIN export_annotation_ontology_events
+        self.config['ctx'] = ctx
+        anno_api = self.build_api(ctx, params)
+        output = anno_api.export_annotation_ontology_events(params)
+        #END export_annotation_ontology_events
+
+        # At some point might do deeper type checking...
+        if not isinstance(output, dict):
+            raise ValueError('Method export_annotation_ontology_events return value ' +
+                             'output is not type dict as required.')
+        # return the results
+        return [output]
+
     def add_annotation_ontology_events(self, ctx, params):
         """
         Adds a new annotation ontology event to a genome or AMA
         :param params: instance of type "AddAnnotationOntologyEventsParams"
            -> structure: parameter "input_ref" of String, parameter
            "input_workspace" of String, parameter "output_name" of String,
-           parameter "output_workspace" of String, parameter "events" of list
-           of type "AnnotationOntologyEvent" -> structure: parameter
-           "event_id" of String, parameter "ontology_id" of String, parameter
-           "method" of String, parameter "method_version" of String,
-           parameter "timestamp" of String, parameter "ontology_terms" of
-           mapping from String to list of type "AnnotationOntologyTerm"
-           (Insert your typespec information here.) -> structure: parameter
-           "term" of String, parameter "modelseed_id" of String, parameter
+           parameter "output_workspace" of String, parameter
+           "clear_existing" of Long, parameter "overwrite_matching" of Long,
+           parameter "incremental" of Long, parameter "events" of list of
+           type "AnnotationOntologyEvent" -> structure: parameter "event_id"
+           of String, parameter "description" of String, parameter
+           "ontology_id" of String, parameter "method" of String, parameter
+           "method_version" of String, parameter "timestamp" of String,
+           parameter "feature_types" of mapping from String to String,
+           parameter "ontology_terms" of mapping from String to list of type
+           "AnnotationOntologyTerm" -> structure: parameter "term" of
+           String, parameter "modelseed_ids" of list of String, parameter
            "evidence" of String
         :returns: instance of type "AddAnnotationOntologyEventsOutput" ->
            structure: parameter "output_ref" of String
@@ -114,14 +208,7 @@ class annotation_ontology_api:
         #BEGIN add_annotation_ontology_events
         self.config['ctx'] = ctx
         #print(("Input parameters: " + pformat(params)))
-        anno_api = None
-        if self.ws_client == None:
-            if "workspace-url" in params:
-                anno_api = AnnotationOntologyAPI(self.config,workspaceService(params['workspace-url'], token=ctx['token']),self.dfu_client)
-            else:
-                anno_api = AnnotationOntologyAPI(self.config,workspaceService(self.config['workspace-url'], token=ctx['token']),self.dfu_client)
-        else:
-            anno_api = AnnotationOntologyAPI(self.config,self.ws_client,self.dfu_client)
+        anno_api = self.build_api(ctx, params)
         output = anno_api.add_annotation_ontology_events(params)
         #END add_annotation_ontology_events
 
@@ -131,6 +218,49 @@ class annotation_ontology_api:
                              'output is not type dict as required.')
         # return the results
         return [output]
+    def add_annotation_ontology_events_batch(self, ctx, params):
+        """
+        Adds annotation ontology events to many genomes or AMAs, saving them in batches with one result (or error) per input
+        :param params: instance of type
+           "AddAnnotationOntologyEventsBatchParams" -> structure: parameter
+           "inputs" of list of type "AddAnnotationOntologyEventsInput" ->
+           structure: parameter "input_ref" of String, parameter
+           "input_workspace" of String, parameter "output_name" of String,
+           parameter "clear_existing" of Long, parameter
+           "overwrite_matching" of Long, parameter "incremental" of Long,
+           parameter "events" of list of type "AnnotationOntologyEvent" ->
+           structure: parameter "event_id" of String, parameter
+           "description" of String, parameter "ontology_id" of String,
+           parameter "method" of String, parameter "method_version" of
+           String, parameter "timestamp" of String, parameter
+           "feature_types" of mapping from String to String, parameter
+           "ontology_terms" of mapping from String to list of type
+           "AnnotationOntologyTerm" -> structure: parameter "term" of
+           String, parameter "modelseed_ids" of list of String, parameter
+           "evidence" of String, parameter "output_workspace" of String,
+           parameter "batch_size" of Long
+        :returns: instance of type "AddAnnotationOntologyEventsBatchOutput"
+           -> structure: parameter "results" of list of type
+           "AddAnnotationOntologyEventsResult" -> structure: parameter
+           "input_ref" of String, parameter "output_ref" of String,
+           parameter "output_name" of String, parameter "ftrs_found" of Long,
+           parameter "ftrs_not_found" of list of String, parameter "error" of
+           String
+        """
+        # ctx is the context object
+        # return variables are: output
+        #BEGIN add_annotation_ontology_events_batch
+        self.config['ctx'] = ctx
+        anno_api = self.build_api(ctx, params)
+        output = anno_api.add_annotation_ontology_events_batch(params)
+        #END add_annotation_ontology_events_batch
+
+        # At some point might do deeper type checking...
+        if not isinstance(output, dict):
+            raise ValueError('Method add_annotation_ontology_events_batch return value ' +
+                             'output is not type dict as required.')
+        # return the results
+        return [output]
     def status(self, ctx):
         #BEGIN_STATUS
         returnVal = {'state': "OK",
@@ -337,10 +337,22 @@ class Application(object):
                              name='annotation_ontology_api.get_annotation_ontology_events',
                              types=[dict])
         self.method_authentication['annotation_ontology_api.get_annotation_ontology_events'] = 'optional'  # noqa
+        self.rpc_service.add(impl_annotation_ontology_api.get_annotation_ontology_events_batch,
+                             name='annotation_ontology_api.get_annotation_ontology_events_batch',
+                             types=[dict])
+        self.method_authentication['annotation_ontology_api.get_annotation_ontology_events_batch'] = 'optional'  # noqa
+        self.rpc_service.add(impl_annotation_ontology_api.export_annotation_ontology_events,
+                             name='annotation_ontology_api.export_annotation_ontology_events',
+                             types=[dict])
+        self.method_authentication['annotation_ontology_api.export_annotation_ontology_events'] = 'optional'  # noqa
         self.rpc_service.add(impl_annotation_ontology_api.add_annotation_ontology_events,
                              name='annotation_ontology_api.add_annotation_ontology_events',
                              types=[dict])
         self.method_authentication['annotation_ontology_api.add_annotation_ontology_events'] = 'optional'  # noqa
+        self.rpc_service.add(impl_annotation_ontology_api.add_annotation_ontology_events_batch,
+                             name='annotation_ontology_api.add_annotation_ontology_events_batch',
+                             types=[dict])
+        self.method_authentication['annotation_ontology_api.add_annotation_ontology_events_batch'] = 'optional'  # noqa
         self.rpc_service.add(impl_annotation_ontology_api.status,
                              name='annotation_ontology_api.status',
                              types=[dict])
@@ -0,0 +1,244 @@
+"""
+Asyncio JSON-RPC transport for KBase services, built only on the standard library.
+Requests are HTTP/1.1 POSTs over pooled keep-alive connections opened with
+asyncio.open_connection; a semaphore bounds the calls in flight, and so the open
+connections, per client. A call is only retried when the server cannot have run it:
+failed connects and 429/503 responses are retried with exponential backoff and jitter,
+and a pooled connection already closed by the server when it is taken from the pool is
+replaced before anything is written to it. Any failure once the request is written is
+raised, even on a pooled connection, since methods like add_annotation_ontology_events
+would otherwise run twice. JSON-RPC errors are raised as baseclient.ServerError, the same
+exception the synchronous clients raise.
+"""
+import asyncio
+import json
+import os
+import random
+import ssl
+
+from urllib.parse import urlparse
+
+try:
+    from .baseclient import ServerError
+except ImportError:
+    from baseclient import ServerError
+
+# Statuses a server sends without running the call
+_RETRY_STATUS = frozenset([429, 503])
+
+
+class _ConnectionClosed(ConnectionError):
+    def __init__(self):
+        super(_ConnectionClosed, self).__init__(
+            'Connection closed before a response was received')
+
+
+class _RequestNotSent(Exception):
+    def __init__(self, error):
+        super(_RequestNotSent, self).__init__(str(error))
+        self.error = error
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status, reason):
+        super(_RetryableStatus, self).__init__(str(status) + " " + reason)
+        self.status = status
+        self.reason = reason
+
+
+def _encode_default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(repr(obj) + " is not JSON serializable")
+
+
+class AsyncBaseClient(object):
+    '''
+    Asyncio counterpart of baseclient.BaseClient.
+    Required initialization arguments (positional):
+    url - the url of the service to contact.
+    Optional arguments (keywords):
+    timeout - calls fail if a single attempt takes longer than this value in
+        seconds. Default 1800.
+    token - a KBase authentication token; defaults to KB_AUTH_TOKEN.
+    max_connections - the most calls in flight, and connections open, at once.
+    max_retries - how often a failed connect or 429/503 response is retried.
+    backoff - the first retry delay in seconds; each retry doubles it.
+    max_backoff - the longest retry delay in seconds.
+    trust_all_ssl_certificates - set to True to trust self-signed certificates.
+    '''
+    def __init__(self, url=None, timeout=30 * 60, token=None,
+                 max_connections=100, max_retries=3, backoff=0.5,
+                 max_backoff=30, trust_all_ssl_certificates=False):
+        if url is None:
+            raise ValueError('A url is required')
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise ValueError(url + " isn't a valid http url")
+        self.url = url
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.path = (parsed.path or '/') + ('?' + parsed.query if parsed.query else '')
+        self.ssl = None
+        if parsed.scheme == 'https':
+            self.ssl = ssl.create_default_context()
+            if trust_all_ssl_certificates:
+                self.ssl.check_hostname = False
+                self.ssl.verify_mode = ssl.CERT_NONE
+        self.timeout = timeout
+        if self.timeout < 1:
+            raise ValueError('Timeout value must be at least 1 second')
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._headers = {'Content-Type': 'application/json',
+                         'Host': parsed.netloc}
+        if token is None:
+            token = os.environ.get('KB_AUTH_TOKEN')
+        if token is not None:
+            self._headers['Authorization'] = token
+        self._idle = []
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        '''Closes every idle pooled connection.'''
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    async def call_method(self, service_method, args, service_ver=None,
+                          context=None):
+        '''
+        Calls a service method and returns its result.
+        service_method - the service and method to run, e.g. myserv.mymeth.
+        args - a list of arguments to the method.
+        '''
+        if service_ver:
+            context = dict(context or {})
+            context['service_ver'] = service_ver
+        arg_hash = {'method': service_method,
+                    'params': args,
+                    'version': '1.1',
+                    'id': str(random.random())[2:]}
+        if context:
+            if type(context) is not dict:
+                raise ValueError('context is not type dict as required.')
+            arg_hash['context'] = context
+        body = json.dumps(arg_hash, default=_encode_default).encode('utf-8')
+        attempt = 0
+        while True:
+            try:
+                status, headers, data = await self._post(body)
+                if status in _RETRY_STATUS:
+                    raise _RetryableStatus(status, data.decode('utf-8', 'replace'))
+                return self._parse_response(status, headers, data)
+            except (_RequestNotSent, _RetryableStatus) as e:
+                if attempt >= self.max_retries:
+                    if isinstance(e, _RetryableStatus):
+                        raise ServerError('HTTPError', e.status, e.reason)
+                    raise e.error
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1))
+            attempt += 1
+
+    def _parse_response(self, status, headers, data):
+        text = data.decode('utf-8', 'replace')
+        if status == 500:
+            if headers.get('content-type') == 'application/json':
+                err = json.loads(text)
+                if 'error' in err:
+                    raise ServerError(**err['error'])
+            raise ServerError('Unknown', 0, text)
+        if status < 200 or status > 299:
+            raise ServerError('HTTPError', status, text)
+        resp = json.loads(text)
+        if 'result' not in resp:
+            raise ServerError('Unknown', 0, 'An unknown server error occurred')
+        if not resp['result']:
+            return
+        if len(resp['result']) == 1:
+            return resp['result'][0]
+        return resp['result']
+
+    async def _post(self, body):
+        # The semaphore belongs to the loop the client is first used in
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        async with self._semaphore:
+            while True:
+                if self._idle:
+                    connection = self._idle.pop()
+                    reader, writer = connection
+                    # The server closed this connection while it was idle: nothing
+                    # was sent on it, so another connection takes the request
+                    if (reader.at_eof() or reader.exception() is not None or
+                            writer.is_closing()):
+                        writer.close()
+                        continue
+                else:
+                    try:
+                        connection = await asyncio.wait_for(
+                            asyncio.open_connection(
+                                self.host, self.port, ssl=self.ssl),
+                            self.timeout)
+                    except (OSError, asyncio.TimeoutError) as e:
+                        raise _RequestNotSent(e)
+                try:
+                    status, headers, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(connection, body), self.timeout)
+                except BaseException:
+                    connection[1].close()
+                    raise
+                if keep_alive:
+                    self._idle.append(connection)
+                else:
+                    connection[1].close()
+                return status, headers, data
+
+    async def _exchange(self, connection, body):
+        reader, writer = connection
+        head = 'POST ' + self.path + ' HTTP/1.1\r\n'
+        for name in self._headers:
+            head += name + ': ' + self._headers[name] + '\r\n'
+        head += 'Content-Length: ' + str(len(body)) + '\r\n\r\n'
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise _ConnectionClosed()
+        parts = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        status = int(parts[1])
+        headers = await self._read_headers(reader)
+        keep_alive = (parts[0] == 'HTTP/1.1' and
+                      headers.get('connection', '').lower() != 'close')
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    await self._read_headers(reader)
+                    break
+                data.extend(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = bytes(data)
+        elif 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return status, headers, data, keep_alive
+
+    async def _read_headers(self, reader):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
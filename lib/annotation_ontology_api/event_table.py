@@ -0,0 +1,79 @@
+"""
+Columnar export of annotation ontology events: one row per event, feature and term,
+written as Parquet or Arrow IPC so analytics jobs can load millions of rows without
+decoding the nested JSON of get_annotation_ontology_events. pyarrow is optional and only
+needed to export.
+"""
+import json
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EVENT_TABLE_FORMATS = ["parquet","arrow"]
+
+EVENT_TABLE_COLUMNS = ["event_id","ontology_id","feature_id","feature_type","term","modelseed_ids","evidence"]
+
+def event_table_schema():
+    string_columns = [(column,pyarrow.string()) for column in EVENT_TABLE_COLUMNS]
+    string_columns[5] = ("modelseed_ids",pyarrow.list_(pyarrow.string()))
+    return pyarrow.schema(string_columns)
+
+class EventTableWriter:
+    """
+    Writes the (event, ontology_terms, feature_types) chunks of
+    iterate_annotation_ontology_events to filename, buffering rows so each batch written
+    holds about batch_rows rows whatever the chunking of the events.
+    """
+    def __init__(self,filename,format = "parquet",batch_rows = 100000):
+        if pyarrow == None:
+            raise ValueError("Exporting events as a table requires pyarrow, which is not installed")
+        if format not in EVENT_TABLE_FORMATS:
+            raise ValueError("Unsupported table format "+str(format)+"; use one of "+", ".join(EVENT_TABLE_FORMATS))
+        self.schema = event_table_schema()
+        self.batch_rows = batch_rows
+        self.columns = {column : [] for column in EVENT_TABLE_COLUMNS}
+        self.row_count = 0
+        self.sink = None
+        if format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(filename,self.schema)
+        else:
+            self.sink = pyarrow.OSFile(filename,"wb")
+            self.writer = pyarrow.ipc.new_file(self.sink,self.schema)
+
+    def add(self,event,ontology_terms,feature_types):
+        columns = self.columns
+        for feature_id in ontology_terms:
+            for termdata in ontology_terms[feature_id]:
+                evidence = termdata.get("evidence")
+                if evidence != None and not isinstance(evidence,str):
+                    evidence = json.dumps(evidence)
+                columns["event_id"].append(event.get("event_id"))
+                columns["ontology_id"].append(event.get("ontology_id"))
+                columns["feature_id"].append(feature_id)
+                columns["feature_type"].append(feature_types.get(feature_id))
+                columns["term"].append(termdata["term"])
+                columns["modelseed_ids"].append(termdata.get("modelseed_ids",[]))
+                columns["evidence"].append(evidence)
+        if len(columns["term"]) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if len(self.columns["term"]) == 0:
+            return
+        arrays = [pyarrow.array(self.columns[field.name],type=field.type) for field in self.schema]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays,schema=self.schema))
+        self.row_count += len(self.columns["term"])
+        self.columns = {column : [] for column in EVENT_TABLE_COLUMNS}
+
+    def close(self):
+        """Writes the buffered rows and closes the file, returning the number of rows written"""
+        try:
+            self.flush()
+        finally:
+            self.writer.close()
+            if self.sink != None:
+                self.sink.close()
+        return self.row_count
@@ -0,0 +1,115 @@
+"""
+Feature indexes of a genome or AMA: the typed feature index used to look features up by
+id, and the on-disk cache of the alias -> feature id index. A workspace object version
+never changes, so the alias index is keyed by its wsid/objid/ver reference and stored as
+gzipped JSON, one file per version, where every process on the host can reuse it. Reads
+refresh an index's mtime, and the least recently read indexes are evicted once the
+directory exceeds its size cap.
+"""
+import gzip
+import json
+import os
+
+FEATURE_INDEX_VERSION = 3
+
+#Feature lists of a genome, in object order, with the type reported for their features
+feature_list_types = [("features","gene"),("cdss","cds"),("mrnas","mrna"),("non_coding_features","noncoding")]
+
+class FeatureIndex:
+    """
+    Every feature of a genome with its type, in object order, built in one pass over the
+    feature lists. Features are found by id without scanning the genome.
+    """
+    def __init__(self,features = None,type = "gene"):
+        self.features = []
+        self.types = []
+        self.positions = {}
+        if features != None:
+            for ftr in features:
+                self.add(ftr,type)
+
+    def add(self,ftr,type):
+        if ftr["id"] not in self.positions:
+            self.positions[ftr["id"]] = []
+        self.positions[ftr["id"]].append(len(self.features))
+        self.features.append(ftr)
+        self.types.append(type)
+
+    def add_genome(self,genome):
+        for (feature_list,type) in feature_list_types:
+            for ftr in genome.get(feature_list,[]):
+                self.add(ftr,type)
+
+    def type(self,feature_id):
+        #A feature id repeated across lists takes the type of its last list
+        return self.types[self.positions[feature_id][-1]]
+
+    def select(self,feature_ids):
+        """Returns the features with the given ids, in object order"""
+        positions = set()
+        for feature_id in feature_ids:
+            positions.update(self.positions.get(feature_id,[]))
+        return [self.features[position] for position in sorted(positions)]
+
+def feature_index_path(directory,ref):
+    return directory+"/"+ref.replace("/","_")+".json.gz"
+
+def read_feature_index(directory,ref):
+    """Returns the cached alias hash for ref, or None when there is no usable index"""
+    path = feature_index_path(directory,ref)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path,"rt") as file:
+            index = json.load(file)
+    except (IOError,OSError,ValueError,EOFError) as e:
+        print("Ignoring feature index "+path+": "+str(e))
+        return None
+    if index.get("version") != FEATURE_INDEX_VERSION or index.get("ref") != ref:
+        return None
+    try:
+        os.utime(path,None)
+    except OSError:
+        pass
+    return index["aliases"]
+
+def write_feature_index(directory,ref,alias_hash,compresslevel = 6,max_bytes = None):
+    #Written next to its destination and renamed into place so readers never see a partial file
+    path = feature_index_path(directory,ref)
+    temp_path = path+".tmp."+str(os.getpid())
+    try:
+        os.makedirs(directory,exist_ok=True)
+        with gzip.open(temp_path,"wt",compresslevel=compresslevel) as file:
+            json.dump({"version" : FEATURE_INDEX_VERSION,"ref" : ref,"aliases" : alias_hash},file,separators=(",",":"))
+        os.replace(temp_path,path)
+    except (IOError,OSError) as e:
+        print("Could not write feature index "+path+": "+str(e))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    if max_bytes != None:
+        evict_feature_indexes(directory,max_bytes,path)
+
+def evict_feature_indexes(directory,max_bytes,keep = None):
+    """Removes the least recently read indexes until directory fits in max_bytes"""
+    entries = []
+    total = 0
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json.gz"):
+            continue
+        path = directory+"/"+filename
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime,path,stat.st_size))
+        total += stat.st_size
+    for (last_read,path,size) in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
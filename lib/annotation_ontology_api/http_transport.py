@@ -0,0 +1,80 @@
+"""
+Connection pooling for the Workspace and DataFileUtil clients this service builds. Their
+baseclient.py is generated by kb-sdk install and posts every call with a bare
+requests.post, opening a new TCP/TLS connection each time. use_pooled_transport points a
+generated baseclient module at one keep-alive requests.Session per process instead,
+without editing the generated file. max_per_host bounds the connections, and so the
+concurrent calls, to any one host; further calls wait for a free connection.
+
+Only the baseclient modules passed to use_pooled_transport are pooled. Callers of this
+service use their own generated client, and the asyncio client pools on its own.
+"""
+import os
+import threading
+
+import requests
+
+# Defaults for the pool limits; the Impl applies http_pool_size and http_max_per_host
+_POOL_SIZE = int(os.environ.get('KB_HTTP_POOL_SIZE', 10))
+_MAX_PER_HOST = int(os.environ.get('KB_HTTP_MAX_PER_HOST', 10))
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def configure_transport(pool_size=None, max_per_host=None):
+    '''
+    Sets the connection pool limits for later calls, closing the current
+    session's idle connections.
+    pool_size - the number of hosts to keep connection pools for.
+    max_per_host - the maximum number of connections to one host.
+    '''
+    global _POOL_SIZE, _MAX_PER_HOST, _session
+    with _session_lock:
+        if pool_size is not None:
+            _POOL_SIZE = int(pool_size)
+        if max_per_host is not None:
+            _MAX_PER_HOST = int(max_per_host)
+        # A session inherited from the parent of a forked worker is not ours to close
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+
+
+def get_session():
+    '''Returns the process's pooled session, opening it on first use.'''
+    # A forked worker opens its own session rather than sharing its
+    # parent's sockets
+    global _session, _session_pid
+    session = _session
+    if session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=_POOL_SIZE, pool_maxsize=_MAX_PER_HOST,
+                    pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session_pid = os.getpid()
+                _session = session
+            session = _session
+    return session
+
+
+class PooledRequests(object):
+    '''
+    The requests module as a generated baseclient sees it: post goes through
+    the pooled session, everything else is the requests module's own.
+    '''
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def post(self, *args, **kwargs):
+        return get_session().post(*args, **kwargs)
+
+
+def use_pooled_transport(baseclient):
+    '''Sends the calls of every client built on a generated baseclient module through the pool.'''
+    baseclient._requests = PooledRequests()
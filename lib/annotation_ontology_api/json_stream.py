@@ -0,0 +1,138 @@
+"""
+Incremental JSON reading and writing for large reference and feature files. Only the
+container being iterated is walked by hand; each member is decoded with the stdlib decoder,
+so peak memory is one member plus a read buffer rather than the whole document.
+"""
+import gzip
+import hashlib
+import json
+
+class JSONStream:
+    def __init__(self,file,chunk_size = 1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def read_more(self,size = None):
+        if self.eof:
+            return False
+        #Dropping what has been consumed before growing the buffer
+        if self.position > 0:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        data = self.file.read(size or self.chunk_size)
+        if isinstance(data,bytes):
+            data = data.decode("utf-8")
+        if len(data) == 0:
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return None
+
+    def expect(self,characters):
+        character = self.peek()
+        if character == None or character not in characters:
+            raise ValueError("Expected one of '"+characters+"' but found "+repr(character))
+        self.position += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer,self.position)
+                #A number or literal that ends with the buffer may continue in the next read
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            #Growing geometrically keeps retries on large members linear overall
+            self.read_more(max(self.chunk_size,len(self.buffer)))
+
+    def object_items(self):
+        """Yields (key, value) for each member of the object at the current position"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self.value()
+            if self.expect(",}") == "}":
+                return
+
+    def array_items(self):
+        """Yields each element of the array at the current position"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+    def descend(self,key):
+        """Moves into the value of key in the object at the current position"""
+        self.expect("{")
+        while self.peek() != "}":
+            if self.value() == key:
+                self.expect(":")
+                return
+            self.expect(":")
+            self.value()
+            if self.peek() == ",":
+                self.position += 1
+        raise KeyError(key)
+
+def iterate_json_object(filename,path = None):
+    """Yields the members of the object found by following path from the document root"""
+    with open(filename) as file:
+        stream = JSONStream(file)
+        for key in path or []:
+            stream.descend(key)
+        for item in stream.object_items():
+            yield item
+
+class HashingWriter:
+    """Binary file wrapper that keeps the md5 of everything written through it"""
+    def __init__(self,file):
+        self.file = file
+        self.md5 = hashlib.md5()
+
+    def write(self,data):
+        self.md5.update(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+def write_json_array_gzip(filename,items,compresslevel = 6):
+    """
+    Writes items as a gzip-compressed JSON array, serializing one item at a time.
+    Returns the md5 hex digest of the compressed file.
+    """
+    with open(filename,"wb") as file:
+        writer = HashingWriter(file)
+        with gzip.GzipFile(fileobj=writer,mode="wb",compresslevel=compresslevel) as gzip_file:
+            separator = b"["
+            for item in items:
+                gzip_file.write(separator+json.dumps(item).encode("utf-8"))
+                separator = b","
+            gzip_file.write(b"]" if separator == b"," else b"[]")
+    return writer.md5.hexdigest()
@@ -0,0 +1,463 @@
+import functools
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from annotation_ontology_api.json_stream import iterate_json_object
+from annotation_ontology_api.snapshot import Snapshot, SNAPSHOT_FILENAME, source_checksum, source_fingerprint, write_snapshot
+
+source_hash = {
+    "MetaCyc" : "META",
+    "KEGG" : "RO",
+    "BiGG" : "BIGG",
+    "rhea" : "RHEA"
+}
+
+#Ontologies that ship a <TYPE>_dictionary.json with term names
+dictionary_types = ["SSO","EC","TC","META","RO","KO","GO"]
+
+#Reference file backing each namespace in the alias hash
+namespace_files = {
+    "MSRXN" : "msrxn_hash.json",
+    "EC" : "EC_translation.tsv",
+    "META" : "ModelSEED_Reaction_Aliases.txt",
+    "RO" : "ModelSEED_Reaction_Aliases.txt",
+    "BIGG" : "ModelSEED_Reaction_Aliases.txt",
+    "RHEA" : "ModelSEED_Reaction_Aliases.txt",
+    "KO" : "kegg_95_0_ko_seed.tsv",
+    "SSO" : "SSO_reactions.json",
+    "GO" : "GO_ontology_translation.json"
+}
+
+def source_files():
+    #Every reference file that can feed a table, whether or not it is present
+    filenames = set(namespace_files.values())
+    for type in dictionary_types:
+        filenames.add(type+"_dictionary.json")
+    return sorted(filenames)
+
+class ReferenceData:
+    """
+    Ontology translation tables and term names shared by every AnnotationOntologyAPI
+    in the process. Each table is loaded once, under a lock, and published only when
+    complete, so readers never take the lock after the first load. Tables are shared
+    between requests and must never be modified by callers.
+
+    When a snapshot path is given, tables are served from the compiled snapshot, which
+    is rebuilt first if its checksum no longer matches the reference files.
+    """
+    def __init__(self,data_directory,snapshot_path = None):
+        self.data_directory = data_directory
+        self.snapshot_path = snapshot_path
+        self.snapshot = None
+        self.snapshot_checked = snapshot_path == None
+        self.lock = threading.RLock()
+        self.alias_hash = {}
+        self.term_names = {}
+        self.term_synonyms = {}
+        self.seed_roles = None
+        self.term_memo = None
+        #Counts are kept under their own lock so they never wait on a table load
+        self.term_memo_counts = {"hits" : 0,"misses" : 0}
+        self.term_memo_counts_lock = threading.Lock()
+        self.loaded = {}
+
+    def get_snapshot(self):
+        if not self.snapshot_checked:
+            with self.lock:
+                if not self.snapshot_checked:
+                    self.snapshot = self.open_snapshot()
+                    self.snapshot_checked = True
+        return self.snapshot
+
+    def open_snapshot(self):
+        filenames = source_files()
+        if os.path.exists(self.snapshot_path):
+            try:
+                snapshot = Snapshot(self.snapshot_path)
+                if snapshot.is_current(self.data_directory,filenames):
+                    return snapshot
+            except ValueError as e:
+                print("Ignoring reference snapshot: "+str(e))
+        print("Rebuilding stale reference snapshot "+self.snapshot_path)
+        try:
+            build_snapshot(self.data_directory,self.snapshot_path)
+        except (IOError, OSError) as e:
+            #Falling back on the reference files when the snapshot cannot be written
+            print("Could not write reference snapshot: "+str(e))
+            return None
+        return Snapshot(self.snapshot_path)
+
+    def get_snapshot_table(self,name):
+        snapshot = self.get_snapshot()
+        if snapshot != None and name in snapshot.tables:
+            return snapshot.tables[name]
+        return None
+
+    def get_alias_hash(self,namespace):
+        if namespace not in self.alias_hash:
+            with self.lock:
+                if namespace not in self.alias_hash:
+                    start = time.time()
+                    table = self.get_snapshot_table("alias:"+namespace)
+                    if table != None:
+                        self.record_load("alias:"+namespace,"snapshot",table,start)
+                        self.alias_hash[namespace] = table
+                    else:
+                        self.load_alias_hash(namespace)
+        return self.alias_hash[namespace]
+
+    def get_term_names(self,type):
+        if type not in self.term_names:
+            self.load_dictionary(type)
+        return self.term_names[type]
+
+    def get_term_synonyms(self,type):
+        if type not in self.term_synonyms:
+            self.load_dictionary(type)
+        return self.term_synonyms[type]
+
+    def load_dictionary(self,type):
+        with self.lock:
+            if type in self.term_names:
+                return
+            start = time.time()
+            source = "snapshot"
+            names = self.get_snapshot_table("names:"+type)
+            synonyms = self.get_snapshot_table("synonyms:"+type)
+            if names == None:
+                source = type+"_dictionary.json"
+                names = {}
+                synonyms = {}
+                if type in dictionary_types:
+                    for term, data in self.iterate_json(type+"_dictionary.json",["term_hash"]):
+                        names[term] = data["name"]
+                        if len(data.get("synonyms",[])) > 0:
+                            synonyms[term] = data["synonyms"]
+            self.record_load("names:"+type,source,names,start)
+            #Synonyms are published first since readers test for names
+            self.term_synonyms[type] = synonyms
+            self.term_names[type] = names
+
+    def get_seed_roles(self):
+        """Returns the index of SEED search roles to SSO terms"""
+        if self.seed_roles == None:
+            with self.lock:
+                if self.seed_roles == None:
+                    start = time.time()
+                    source = "snapshot"
+                    seed_roles = self.get_snapshot_table("seed_roles")
+                    if seed_roles == None:
+                        source = "SSO_dictionary.json"
+                        seed_roles = {}
+                        for term, data in self.iterate_json("SSO_dictionary.json",["term_hash"]):
+                            seed_roles[convert_role_to_searchrole(data["name"])] = term
+                    self.record_load("seed_roles",source,seed_roles,start)
+                    self.seed_roles = seed_roles
+        return self.seed_roles
+
+    def iterate_json(self,filename,path = None):
+        return iterate_json_object(self.data_directory+"/"+filename,path)
+
+    def iterate_lines(self,filename,header = False):
+        with open(self.data_directory+"/"+filename, 'r') as file:
+            if header:
+                next(file,None)
+            for line in file:
+                yield line.rstrip("\n")
+
+    def record_load(self,name,source,table,start):
+        self.loaded[name] = {
+            "source" : source,
+            "terms" : len(table),
+            "seconds" : round(time.time()-start,3)
+        }
+
+    def loaded_namespaces(self):
+        """Reports which tables this process has loaded, from where, and at what cost"""
+        return dict(self.loaded)
+
+    def load_alias_hash(self,namespace):
+        #Each namespace reads only its own file; MSRXN is loaded only when a loader needs it
+        start = time.time()
+        if namespace not in namespace_files:
+            tables = {namespace : {}}
+        elif namespace == "MSRXN":
+            tables = {"MSRXN" : dict(self.iterate_json("msrxn_hash.json"))}
+        else:
+            msrxn = self.get_alias_hash("MSRXN")
+            if namespace == "EC":
+                tables = self.load_ec_aliases(msrxn)
+            elif namespace == "META" or namespace == "RO" or namespace == "BIGG" or namespace == "RHEA":
+                tables = self.load_reaction_aliases(msrxn)
+            elif namespace == "KO":
+                tables = self.load_ko_aliases(msrxn)
+            elif namespace == "SSO":
+                tables = self.load_sso_aliases(msrxn)
+            elif namespace == "GO":
+                tables = self.load_go_aliases(msrxn)
+        #Tables are compacted and published together once complete
+        for name in tables:
+            tables[name] = AliasTable(tables[name])
+            self.record_load("alias:"+name,namespace_files.get(name),tables[name],start)
+        self.alias_hash.update(tables)
+
+    def load_ec_aliases(self,msrxn):
+        table = {}
+        for line in self.iterate_lines("EC_translation.tsv",header = True):
+            items = line.split("\t")
+            if len(items) >= 2:
+                add_modelseed_id(table,"EC:"+items[1],items[0],msrxn)
+        return {"EC" : table}
+
+    def load_reaction_aliases(self,msrxn):
+        #One pass over the alias file fills every source it covers
+        tables = {}
+        for source in source_hash.values():
+            tables[source] = {}
+        for line in self.iterate_lines("ModelSEED_Reaction_Aliases.txt"):
+            items = line.split("\t")
+            if len(items) >= 3 and items[2] in source_hash:
+                source = source_hash[items[2]]
+                add_modelseed_id(tables[source],source+":"+items[1],items[0],msrxn)
+        return tables
+
+    def load_ko_aliases(self,msrxn):
+        table = {}
+        for line in self.iterate_lines("kegg_95_0_ko_seed.tsv",header = True):
+            items = line.split("\t")
+            if len(items) >= 2:
+                for modelseed in items[1].split(";"):
+                    add_modelseed_id(table,"KO:"+items[0],modelseed,msrxn)
+        return {"KO" : table}
+
+    def load_sso_aliases(self,msrxn):
+        table = {}
+        for sso, modelseed_ids in self.iterate_json("SSO_reactions.json"):
+            for modelseed in modelseed_ids:
+                add_modelseed_id(table,sso,modelseed,msrxn)
+        return {"SSO" : table}
+
+    def load_go_aliases(self,msrxn):
+        table = {}
+        for term, translation in self.iterate_json("GO_ontology_translation.json",["translation"]):
+            if "equiv_terms" in translation:
+                for rxn_data in translation["equiv_terms"]:
+                    if rxn_data["equiv_term"] != None:
+                        add_modelseed_id(table,"GO:"+term,rxn_data["equiv_term"],msrxn)
+        return {"GO" : table}
+
+    def warm(self,namespaces = None):
+        """
+        Loads every table whose reference file is present so the first request does not
+        pay for parsing. Called once at server startup, before workers are forked.
+        """
+        if namespaces == None:
+            namespaces = list(namespace_files.keys())
+        for namespace in namespaces:
+            if os.path.exists(self.data_directory+"/"+namespace_files[namespace]):
+                self.get_alias_hash(namespace)
+        for type in dictionary_types:
+            if os.path.exists(self.data_directory+"/"+type+"_dictionary.json"):
+                self.get_term_names(type)
+        if os.path.exists(self.data_directory+"/SSO_dictionary.json"):
+            self.get_seed_roles()
+        for name in sorted(self.loaded):
+            print("Loaded "+name+" from "+str(self.loaded[name]["source"])+": "+str(self.loaded[name]["terms"])+" terms in "+str(self.loaded[name]["seconds"])+"s")
+
+    def get_term_memo(self,max_size):
+        """Returns the term memo shared by every request in the process, creating it on first use"""
+        if self.term_memo == None:
+            with self.lock:
+                if self.term_memo == None:
+                    self.term_memo = TermMemo(max_size)
+        return self.term_memo
+
+    def count_term_memo(self,hits,misses):
+        with self.term_memo_counts_lock:
+            self.term_memo_counts["hits"] += hits
+            self.term_memo_counts["misses"] += misses
+
+    def term_memo_report(self):
+        """Reports term memo hits and misses across every request in this process, and the shared memo's size"""
+        with self.term_memo_counts_lock:
+            report = dict(self.term_memo_counts)
+        if self.term_memo != None:
+            report["terms"] = len(self.term_memo.terms)
+            report["max_size"] = self.term_memo.max_size
+        return report
+
+class TermMemo:
+    """
+    Memo of (original tag, original term) -> (normalized term, ModelSEED IDs), so a term
+    repeated across features is normalized and translated once. Unbounded by default, as
+    used for a single request; with max_size it is a thread-safe LRU that can be shared
+    across requests. Values are shared and must not be modified.
+    """
+    def __init__(self,max_size = None):
+        self.max_size = max_size
+        self.terms = OrderedDict() if max_size else {}
+        self.lock = threading.Lock()
+
+    def get(self,key):
+        if not self.max_size:
+            return self.terms.get(key)
+        with self.lock:
+            value = self.terms.get(key)
+            if value != None:
+                self.terms.move_to_end(key)
+            return value
+
+    def put(self,key,value):
+        if self.max_size:
+            with self.lock:
+                self.terms[key] = value
+                self.terms.move_to_end(key)
+                while len(self.terms) > self.max_size:
+                    self.terms.popitem(last=False)
+        else:
+            self.terms[key] = value
+
+class AliasTable(Mapping):
+    """
+    Read-only alias hash held in integer-coded CSR arrays. Terms are packed into one sorted
+    UTF-8 buffer and found by binary search; each term owns a slice of the value array.
+    ModelSEED reaction IDs are stored as their reaction number and rebuilt only when a term
+    is looked up; any other ID is kept once in a side list and coded with the high bit set.
+    """
+    def __init__(self,table):
+        self.terms = bytearray()
+        self.term_offsets = array("I",[0])
+        self.offsets = array("I",[0])
+        self.values = array("I")
+        self.other_ids = []
+        other_index = {}
+        for term in sorted(table):
+            self.terms.extend(term.encode("utf-8"))
+            self.term_offsets.append(len(self.terms))
+            for modelseed in table[term]:
+                match = reaction_id_pattern.fullmatch(modelseed)
+                if match != None:
+                    self.values.append(int(match.group(1)))
+                else:
+                    if modelseed not in other_index:
+                        other_index[modelseed] = len(self.other_ids)
+                        self.other_ids.append(modelseed)
+                    self.values.append(other_id_flag | other_index[modelseed])
+            self.offsets.append(len(self.values))
+        self.terms = bytes(self.terms)
+
+    def find(self,term):
+        encoded = term.encode("utf-8")
+        low = 0
+        high = len(self.term_offsets)-1
+        while low < high:
+            middle = (low + high) // 2
+            probe = self.terms[self.term_offsets[middle]:self.term_offsets[middle+1]]
+            if probe < encoded:
+                low = middle + 1
+            elif probe > encoded:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def decode(self,value):
+        if value & other_id_flag:
+            return self.other_ids[value & ~other_id_flag]
+        return "MSRXN:rxn%05d" % value
+
+    def __getitem__(self,term):
+        index = self.find(term)
+        if index == None:
+            raise KeyError(term)
+        return [self.decode(value) for value in self.values[self.offsets[index]:self.offsets[index+1]]]
+
+    def __contains__(self,term):
+        return self.find(term) != None
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.terms[self.term_offsets[index]:self.term_offsets[index+1]].decode("utf-8")
+
+    def __len__(self):
+        return len(self.term_offsets)-1
+
+#Only IDs that round-trip exactly through "%05d" are coded as reaction numbers
+reaction_id_pattern = re.compile(r"MSRXN:rxn(\d{5}|[1-9]\d{5,8})")
+other_id_flag = 0x80000000
+
+ec_number_pattern = re.compile(r"[\d\-]+\.[\d\-]+\.[\d\-]+\.[\d\-]*")
+ec_tag_punctuation_pattern = re.compile(r"\(ec:*\)|[\(\)\[\],-]")
+punctuation_table = str.maketrans("","","()[],-")
+
+@functools.lru_cache(maxsize=1 << 16)
+def convert_role_to_searchrole(term):
+    """
+    Normalizes a SEED role for matching: lower case, no whitespace, no EC numbers, nothing
+    after "#", no "(ec:)" tags and no brackets, commas or hyphens. Memoized because RAST
+    genomes repeat the same few thousand function strings across millions of features.
+    Output must stay identical to the original six re.sub passes (see searchrole_test.py).
+    """
+    #str.split() splits on exactly the characters re matches with \s
+    term = "".join(term.lower().split())
+    #Truncating at "#" commutes with EC removal since EC numbers cannot contain "#"
+    comment = term.find("#")
+    if comment >= 0:
+        term = term[:comment]
+    term = ec_number_pattern.sub("",term)
+    #EC removal has to run first, since it can leave an "(ec:)" tag behind
+    if "(ec" in term:
+        return ec_tag_punctuation_pattern.sub("",term)
+    return term.translate(punctuation_table)
+
+def add_modelseed_id(table,term,modelseed,msrxn):
+    #Standardizing the reaction ID to its ModelSEED representative and skipping duplicates
+    modelseed = "MSRXN:"+modelseed
+    if modelseed in msrxn:
+        modelseed = msrxn[modelseed][0]
+    if term not in table:
+        table[term] = []
+    if modelseed not in table[term]:
+        table[term].append(modelseed)
+
+def build_snapshot(data_directory,snapshot_path):
+    """Compiles every reference file present in data_directory into a snapshot"""
+    filenames = source_files()
+    fingerprint = source_fingerprint(data_directory,filenames)
+    checksum = source_checksum(data_directory,filenames)
+    reference = ReferenceData(data_directory)
+    tables = {}
+    for namespace in namespace_files:
+        if fingerprint[namespace_files[namespace]] != None:
+            tables["alias:"+namespace] = reference.get_alias_hash(namespace)
+    for type in dictionary_types:
+        if fingerprint[type+"_dictionary.json"] != None:
+            tables["names:"+type] = reference.get_term_names(type)
+            tables["synonyms:"+type] = reference.get_term_synonyms(type)
+    if fingerprint["SSO_dictionary.json"] != None:
+        tables["seed_roles"] = reference.get_seed_roles()
+    write_snapshot(snapshot_path,tables,checksum,fingerprint)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def get_reference_data(config):
+    """
+    Returns the process-wide ReferenceData for the configured data directory, creating
+    it on first use. The snapshot defaults to data_directory/ontology_reference.snapshot
+    and can be moved with the reference_snapshot config key.
+    """
+    data_directory = config["data_directory"]
+    key = os.path.abspath(data_directory)
+    with _registry_lock:
+        if key not in _registry:
+            snapshot_path = config.get("reference_snapshot",data_directory+"/"+SNAPSHOT_FILENAME)
+            _registry[key] = ReferenceData(data_directory,snapshot_path)
+        return _registry[key]
@@ -0,0 +1,77 @@
+"""
+JSON serializers for the service's request and response bodies. orjson is used when it is
+installed and the standard library otherwise; both encode sets and frozensets as lists and
+objects with a toJSONable method as its result, and both produce UTF-8 bytes ready to send.
+"""
+import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def to_jsonable(obj):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'toJSONable'):
+        return obj.toJSONable()
+    raise TypeError(repr(obj) + ' is not JSON serializable')
+
+
+class JSONObjectEncoder(json.JSONEncoder):
+
+    def default(self, obj):
+        if isinstance(obj, (set, frozenset)) or hasattr(obj, 'toJSONable'):
+            return to_jsonable(obj)
+        return json.JSONEncoder.default(self, obj)
+
+
+class StdlibSerializer(object):
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, cls=JSONObjectEncoder).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(object):
+    '''
+    Encodes straight to bytes without an intermediate str. Non-string keys are
+    stringified as the standard library does; values orjson rejects, such as
+    integers wider than 64 bits, fall back to the standard library.
+    '''
+    name = 'orjson'
+
+    def __init__(self):
+        self.fallback = StdlibSerializer()
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(obj, default=to_jsonable,
+                                option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return self.fallback.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+serializers = {'json': StdlibSerializer, 'orjson': OrjsonSerializer}
+
+
+def get_serializer(name=None):
+    '''
+    Returns the serializer called name, or the fastest one installed if name
+    is empty. Raises ValueError for an unknown or uninstalled serializer.
+    '''
+    if not name:
+        name = 'json' if orjson is None else 'orjson'
+    if name not in serializers:
+        raise ValueError('Unknown JSON serializer ' + name + '; use one of ' +
+                         ', '.join(sorted(serializers)))
+    if name == 'orjson' and orjson is None:
+        raise ValueError('The orjson serializer requires orjson, which is '
+                         'not installed')
+    return serializers[name]()
@@ -0,0 +1,118 @@
+"""
+Least recently used disk cache of files downloaded from shock, keyed by handle id. Each
+cached file has a sidecar recording its size and mtime when it was cached; a file that no
+longer matches it is discarded and downloaded again. Files are handed out open, so another
+process evicting one cannot pull it from under a reader. Reads refresh the sidecar's mtime,
+and the least recently read files are evicted once the cache exceeds its size cap.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+
+class ShockCache:
+    def __init__(self,directory,max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self,handle_id):
+        return self.directory+"/"+re.sub(r"[^\w.-]","_",str(handle_id))
+
+    def open(self,handle_id,download):
+        """
+        Returns the cached file for handle_id opened for binary reading, calling
+        download(directory) to fetch it into a scratch directory on a miss. download
+        returns the downloaded path. A file evicted before it could be opened is
+        downloaded once more.
+        """
+        file = self.open_entry(handle_id)
+        attempts = 0
+        while file == None:
+            if attempts == 2:
+                raise IOError("Shock file "+str(handle_id)+" was evicted from "+self.directory+" as it was cached")
+            self.add(handle_id,download)
+            attempts += 1
+            file = self.open_entry(handle_id)
+        return file
+
+    def open_entry(self,handle_id):
+        """Opens the cached file for handle_id, or returns None if it is missing or corrupt"""
+        path = self.path(handle_id)
+        try:
+            file = open(path,"rb")
+        except (IOError,OSError):
+            return None
+        #Checked against the open file, which stays readable whatever happens to the path
+        stat = os.fstat(file.fileno())
+        entry = self.read_entry(path)
+        if entry == None:
+            #No sidecar yet: another process may be adding it, so this is only a miss
+            file.close()
+            return None
+        if entry.get("handle_id") != handle_id or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            file.close()
+            print("Discarding corrupt shock cache entry "+path)
+            self.remove(path)
+            return None
+        try:
+            os.utime(path+".json",None)
+        except OSError:
+            pass
+        return file
+
+    def read_entry(self,path):
+        try:
+            with open(path+".json") as file:
+                return json.load(file)
+        except (IOError,OSError,ValueError):
+            return None
+
+    def add(self,handle_id,download):
+        path = self.path(handle_id)
+        os.makedirs(self.directory,exist_ok=True)
+        download_directory = tempfile.mkdtemp(dir=self.directory,prefix=".download.")
+        try:
+            downloaded = download(download_directory)
+            os.replace(downloaded,path)
+            stat = os.stat(path)
+            entry = {"handle_id" : handle_id,"size" : stat.st_size,"mtime_ns" : stat.st_mtime_ns}
+            with open(path+".json.tmp","w") as file:
+                json.dump(entry,file)
+            os.replace(path+".json.tmp",path+".json")
+        finally:
+            shutil.rmtree(download_directory,ignore_errors=True)
+        self.evict(path)
+
+    def remove(self,path):
+        for filename in [path,path+".json"]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def evict(self,keep = None):
+        """Removes the least recently read files until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for filename in os.listdir(self.directory):
+            path = self.directory+"/"+filename
+            if filename.startswith(".") or filename.endswith(".json") or filename.endswith(".tmp"):
+                continue
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                continue
+            #Reads touch the sidecar, so its mtime is the time the file was last read
+            try:
+                last_read = os.stat(path+".json").st_mtime
+            except OSError:
+                last_read = 0
+            entries.append((last_read,path,size))
+            total += size
+        for (last_read,path,size) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self.remove(path)
+                total -= size
@@ -0,0 +1,228 @@
+"""
+Binary snapshot of the ontology reference data.
+
+Layout: a fixed header (magic, format version, sha256 of the source files, TOC length),
+a JSON table of contents, then 4-byte aligned sections. Every distinct string is stored
+once in a table sorted by code point, so string ids compare in the same order as the
+strings. Each table is a CSR structure over string ids: sorted key ids, value offsets
+(one per key plus one), and value ids.
+"""
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+SNAPSHOT_VERSION = 3
+SNAPSHOT_MAGIC = b"AOSNAP\x00\x00"
+SNAPSHOT_HEADER = struct.Struct("<8sI32sI")
+SNAPSHOT_FILENAME = "ontology_reference.snapshot"
+
+def source_fingerprint(data_directory,filenames):
+    #Cheap stat fingerprint used to skip the content checksum when nothing changed
+    fingerprint = {}
+    for filename in filenames:
+        path = data_directory+"/"+filename
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint[filename] = [stat.st_size,stat.st_mtime_ns]
+        else:
+            fingerprint[filename] = None
+    return fingerprint
+
+def source_checksum(data_directory,filenames):
+    checksum = hashlib.sha256()
+    checksum.update(str(SNAPSHOT_VERSION).encode())
+    for filename in sorted(filenames):
+        checksum.update(filename.encode()+b"\x00")
+        path = data_directory+"/"+filename
+        if not os.path.exists(path):
+            checksum.update(b"missing\x00")
+            continue
+        with open(path,"rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                checksum.update(block)
+    return checksum.digest()
+
+def write_snapshot(path,tables,checksum,fingerprint):
+    """
+    Writes tables (name -> {key: list of strings, or a single string}) to path. The file
+    is written next to its destination and renamed into place so concurrent readers never
+    see a partial file.
+    """
+    strings = set()
+    single = {}
+    for name in tables:
+        single[name] = False
+        for key in tables[name]:
+            strings.add(key)
+            if isinstance(tables[name][key],str):
+                single[name] = True
+                strings.add(tables[name][key])
+            else:
+                strings.update(tables[name][key])
+    strings = sorted(strings)
+    string_ids = {}
+    string_offsets = array("I",[0])
+    string_data = bytearray()
+    for value in strings:
+        string_ids[value] = len(string_ids)
+        string_data.extend(value.encode("utf-8"))
+        string_offsets.append(len(string_data))
+    sections = [string_offsets,bytes(string_data)]
+    toc = {
+        "byteorder" : sys.byteorder,
+        "sources" : fingerprint,
+        "strings" : {"count" : len(strings),"offsets" : 0,"data" : 1},
+        "tables" : {}
+    }
+    for name in sorted(tables):
+        keys = array("I",sorted(string_ids[key] for key in tables[name]))
+        offsets = array("I",[0])
+        values = array("I")
+        for key_id in keys:
+            if single[name]:
+                values.append(string_ids[tables[name][strings[key_id]]])
+            else:
+                values.extend(string_ids[value] for value in tables[name][strings[key_id]])
+            offsets.append(len(values))
+        toc["tables"][name] = {
+            "keys" : len(sections),
+            "offsets" : len(sections)+1,
+            "values" : len(sections)+2,
+            "single" : single[name]
+        }
+        sections.extend([keys,offsets,values])
+    #Tables refer to sections by index; toc["sections"] holds each section's [offset, length]
+    section_bytes = [section.tobytes() if isinstance(section,array) else section for section in sections]
+    layout = []
+    toc_data = b""
+    #The TOC length feeds back into the section offsets, so lay out until it is stable
+    while True:
+        position = SNAPSHOT_HEADER.size+len(toc_data)
+        layout = []
+        for data in section_bytes:
+            position += (4 - position % 4) % 4
+            layout.append([position,len(data)])
+            position += len(data)
+        toc["sections"] = layout
+        laid_out_length = len(toc_data)
+        toc_data = json.dumps(toc,sort_keys=True).encode("utf-8")
+        if len(toc_data) == laid_out_length:
+            break
+    temp_path = path+".tmp."+str(os.getpid())
+    with open(temp_path,"wb") as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC,SNAPSHOT_VERSION,checksum,len(toc_data)))
+        file.write(toc_data)
+        for index, data in enumerate(section_bytes):
+            file.write(b"\x00"*(layout[index][0]-file.tell()))
+            file.write(data)
+    os.replace(temp_path,path)
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file. Lookups binary search the sorted
+    arrays in place, so nothing is materialized and every worker process mapping the
+    same file shares its physical pages.
+    """
+    def __init__(self,path):
+        self.path = path
+        with open(path,"rb") as file:
+            if os.fstat(file.fileno()).st_size < SNAPSHOT_HEADER.size:
+                raise ValueError("Truncated reference snapshot "+path)
+            #The mapping stays valid after the file is closed or replaced by a rebuild
+            self.buffer = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+        if len(self.buffer) < SNAPSHOT_HEADER.size:
+            raise ValueError("Truncated reference snapshot "+path)
+        magic, version, checksum, toc_length = SNAPSHOT_HEADER.unpack_from(self.buffer,0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported reference snapshot "+path)
+        self.checksum = checksum
+        self.toc = json.loads(self.buffer[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size+toc_length].decode("utf-8"))
+        if self.toc["byteorder"] != sys.byteorder:
+            raise ValueError("Reference snapshot "+path+" was built on a different architecture")
+        self.view = memoryview(self.buffer)
+        self.string_count = self.toc["strings"]["count"]
+        self.string_offsets = self.uint_array(self.toc["strings"]["offsets"])
+        self.string_start = self.toc["sections"][self.toc["strings"]["data"]][0]
+        self.tables = {}
+        for name in self.toc["tables"]:
+            self.tables[name] = SnapshotTable(self,self.toc["tables"][name])
+
+    def uint_array(self,section):
+        start, length = self.toc["sections"][section]
+        return self.view[start:start+length].cast("I")
+
+    def is_current(self,data_directory,filenames):
+        if self.toc["sources"] == source_fingerprint(data_directory,filenames):
+            return True
+        return self.checksum == source_checksum(data_directory,filenames)
+
+    def string(self,string_id):
+        start = self.string_start+self.string_offsets[string_id]
+        end = self.string_start+self.string_offsets[string_id+1]
+        return self.buffer[start:end].decode("utf-8")
+
+    def find_string(self,value):
+        encoded = value.encode("utf-8")
+        low = 0
+        high = self.string_count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.string_start+self.string_offsets[middle]
+            probe = self.buffer[start:self.string_start+self.string_offsets[middle+1]]
+            if probe < encoded:
+                low = middle + 1
+            elif probe > encoded:
+                high = middle
+            else:
+                return middle
+        return None
+
+class SnapshotTable(Mapping):
+    """
+    Mapping from a key to its list of values, decoded from the mapped arrays on each
+    access and not kept, so a process holds no copy of the tables it reads. Tables with
+    one value per key (term names) map straight to that string.
+    """
+    def __init__(self,snapshot,spec):
+        self.snapshot = snapshot
+        self.keys_array = snapshot.uint_array(spec["keys"])
+        self.offsets = snapshot.uint_array(spec["offsets"])
+        self.values_array = snapshot.uint_array(spec["values"])
+        self.single = spec["single"]
+
+    def index(self,key):
+        string_id = self.snapshot.find_string(key)
+        if string_id == None:
+            return None
+        index = bisect.bisect_left(self.keys_array,string_id)
+        if index < len(self.keys_array) and self.keys_array[index] == string_id:
+            return index
+        return None
+
+    def __getitem__(self,key):
+        index = self.index(key)
+        if index == None:
+            raise KeyError(key)
+        values = [self.snapshot.string(value) for value in self.values_array[self.offsets[index]:self.offsets[index+1]]]
+        if self.single:
+            values = values[0]
+        return values
+
+    def __contains__(self,key):
+        return self.index(key) != None
+
+    def __iter__(self):
+        for string_id in self.keys_array:
+            yield self.snapshot.string(string_id)
+
+    def __len__(self):
+        return len(self.keys_array)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+uwsgi entry point for the service. kb-sdk compile regenerates
+annotation_ontology_apiServer.py from the spec, so the server's extensions live
+here, in an application wrapping the generated one, rather than in that file:
+
+- methods in streaming_methods answer with JSON lines when the client sends
+  "Accept: application/x-ndjson".
+- single JSON-RPC calls are decoded, run through the generated service and
+  encoded by the serializer json_serializer in the config picks, orjson when
+  installed by default. The wrapper writes the response bytes and their
+  content-length itself, so nothing in the generated server is patched.
+
+Every other request (OPTIONS, batches, bad JSON, failed required
+authentication) goes to the generated application unchanged.
+scripts/start_server.sh, written by "make build-startup-script", loads this
+file instead of the generated server.
+"""
+import io
+import traceback
+
+from annotation_ontology_api import annotation_ontology_apiServer as server
+from annotation_ontology_api.serialization import get_serializer
+
+serializer = get_serializer(
+    server.config.get('json_serializer') if server.config else None)
+
+# Methods that can answer with JSON lines instead of a single result
+streaming_methods = {
+    'annotation_ontology_api.get_annotation_ontology_events':
+        server.impl_annotation_ontology_api.iterate_annotation_ontology_events
+}
+
+
+class StreamingApplication(object):
+    '''
+    Serves single JSON-RPC calls with the serializer, and streaming_methods as
+    JSON lines when asked to. Any request it cannot start cleanly goes to the
+    generated application, which answers it as it always has; no method has
+    run by then.
+    '''
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] != 'POST':
+            return self.application(environ, start_response)
+        try:
+            body_size = int(environ.get('CONTENT_LENGTH', 0))
+        except (ValueError):
+            body_size = 0
+        request_body = environ['wsgi.input'].read(body_size)
+        # The generated application reads the body again if it takes over
+        environ['wsgi.input'] = io.BytesIO(request_body)
+        try:
+            req = serializer.loads(request_body)
+        except ValueError:
+            return self.application(environ, start_response)
+        if not isinstance(req, dict) or 'method' not in req:
+            return self.application(environ, start_response)
+        ctx = self.build_context(environ, req)
+        if ctx is None:
+            return self.application(environ, start_response)
+        headers = [
+            ('Access-Control-Allow-Origin', '*'),
+            ('Access-Control-Allow-Headers', environ.get(
+                'HTTP_ACCESS_CONTROL_REQUEST_HEADERS', 'authorization'))]
+        if (req['method'] in streaming_methods and
+                isinstance(req.get('params'), list) and
+                'application/x-ndjson' in environ.get('HTTP_ACCEPT', '')):
+            self.application.log(server.log.INFO, ctx,
+                                 'start streaming method')
+            lines = streaming_methods[req['method']](ctx, *req['params'])
+            start_response('200 OK', headers + [
+                ('content-type', 'application/x-ndjson')])
+            return self.stream_result(ctx, lines)
+        status, response_body = self.call(ctx, req)
+        start_response(status, headers + [
+            ('content-type', 'application/json'),
+            ('content-length', str(len(response_body)))])
+        return [response_body]
+
+    def build_context(self, environ, req):
+        '''
+        Builds the call context as the generated application does, or returns
+        None when authentication the method requires is missing or invalid.
+        '''
+        application = self.application
+        ctx = server.MethodContext(application.userlog)
+        ctx['client_ip'] = server.getIPAddress(environ)
+        ctx['module'], ctx['method'] = req['method'].split('.')
+        ctx['call_id'] = req.get('id')
+        ctx['rpc_context'] = {
+            'call_stack': [{'time': application.now_in_utc(),
+                            'method': req['method']}]
+        }
+        ctx['provenance'] = [{'service': ctx['module'],
+                              'method': ctx['method'],
+                              'method_params': req.get('params')}]
+        auth_req = application.method_authentication.get(req['method'], 'none')
+        token = environ.get('HTTP_AUTHORIZATION')
+        if auth_req != 'none' and token is not None:
+            try:
+                ctx['user_id'] = application.auth_client.get_user(token)
+                ctx['authenticated'] = 1
+                ctx['token'] = token
+            except Exception:
+                if auth_req == 'required':
+                    return None
+        elif auth_req == 'required':
+            return None
+        if environ.get('HTTP_X_FORWARDED_FOR'):
+            application.log(server.log.INFO, ctx, 'X-Forwarded-For: ' +
+                            environ.get('HTTP_X_FORWARDED_FOR'))
+        return ctx
+
+    def call(self, ctx, req):
+        '''
+        Runs a single call through the generated service and returns the
+        status and response body as bytes. Errors are reported as the
+        generated application reports them.
+        '''
+        application = self.application
+        try:
+            application.log(server.log.INFO, ctx, 'start method')
+            result = application.rpc_service.call_py(ctx, req)
+            application.log(server.log.INFO, ctx, 'end method')
+            if result is None:
+                return '200 OK', b''
+            return '200 OK', serializer.dumps(result)
+        except server.JSONRPCError as jre:
+            err = {'error': {'code': jre.code,
+                             'name': jre.message,
+                             'message': jre.data
+                             }
+                   }
+            trace = jre.trace if hasattr(jre, 'trace') else None
+            error = application.process_error(err, ctx, req, trace)
+        except Exception:
+            err = {'error': {'code': 0,
+                             'name': 'Unexpected Server Error',
+                             'message': 'An unexpected server error occurred',
+                             }
+                   }
+            error = application.process_error(err, ctx, req,
+                                              traceback.format_exc())
+        if not isinstance(error, bytes):
+            error = error.encode('utf-8')
+        return '500 Internal Server Error', error
+
+    def stream_result(self, context, lines):
+        # Headers are already sent, so a failure part way through can only be
+        # reported in-band, as a final error line
+        try:
+            for line in lines:
+                yield serializer.dumps(line) + b'\n'
+            self.application.log(server.log.INFO, context,
+                                 'end streaming method')
+        except Exception:
+            trace = traceback.format_exc()
+            self.application.log(server.log.ERR, context,
+                                 trace.split('\n')[0:-1])
+            err = {'error': {'code': 0,
+                             'name': 'Unexpected Server Error',
+                             'message': 'An unexpected server error occurred',
+                             'error': trace
+                             }
+                   }
+            yield serializer.dumps(err) + b'\n'
+
+
+application = StreamingApplication(server.application)
+
+# The generated server registers its own application with uwsgi on import
+try:
+    import uwsgi
+    uwsgi.applications = {'': application}
+except ImportError:
+    pass
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compiles the ontology reference files into the binary snapshot the service loads at
+startup. Usage: build_reference_snapshot.py <data_directory> [snapshot_path]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from annotation_ontology_api.reference_data import build_snapshot  # noqa: E402
+from annotation_ontology_api.snapshot import SNAPSHOT_FILENAME  # noqa: E402
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or len(sys.argv) > 3:
+        print("Usage: " + sys.argv[0] + " <data_directory> [snapshot_path]")
+        sys.exit(1)
+    data_directory = sys.argv[1]
+    snapshot_path = data_directory + "/" + SNAPSHOT_FILENAME
+    if len(sys.argv) == 3:
+        snapshot_path = sys.argv[2]
+    build_snapshot(data_directory, snapshot_path)
+    print("Wrote " + snapshot_path)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+import copy
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+from annotation_ontology_api.feature_index import feature_index_path, read_feature_index, write_feature_index
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def make_genome():
+    features = []
+    for index in range(6):
+        features.append({"id": "gene" + str(index), "location": [["contig", 1, "+", 30]],
+                         "protein_translation": "MKV", "dna_sequence_length": 30, "md5": "",
+                         "cdss": [], "aliases": ["locus:ABC" + str(index), "old" + str(index)],
+                         "ontology_terms": {}})
+    return {"id": "genome", "features": features, "ontology_events": [], "ontologies_present": {}}
+
+
+def make_event(method, genes):
+    return {"id": "EC", "method": method, "method_version": "1", "timestamp": "2020",
+            "ontology_terms": {gene: [{"term": "EC:1.1.1.1"}] for gene in genes}}
+
+
+class addEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = AnnotationOntologyAPI({"data_directory": data_directory})
+
+    def add(self, genome, events, **params):
+        params.update({"object": genome, "type": "KBaseGenomes.Genome", "save": 0,
+                       "events": copy.deepcopy(events)})
+        return self.api.add_annotation_ontology_events(params)
+
+    def annotated_genome(self):
+        # A genome already upgraded and holding one event, as a full add leaves it
+        return self.add(make_genome(), [make_event("first", ["gene0"])])["object"]
+
+    def test_incremental_leaves_untouched_features_byte_identical(self):
+        genome = self.annotated_genome()
+        before = [json.dumps(ftr, sort_keys=True) for ftr in genome["features"]]
+        output = self.add(copy.deepcopy(genome), [make_event("second", ["gene2"])], incremental=1)
+        after = [json.dumps(ftr, sort_keys=True) for ftr in output["object"]["features"]]
+        self.assertEqual([index for index in range(6) if before[index] != after[index]], [2])
+        self.assertEqual(output["object"]["features"][2]["ontology_terms"], {"EC": {"EC:1.1.1.1": [1]}})
+
+    def test_incremental_appends_at_next_event_index_and_skips_present_ids(self):
+        genome = self.annotated_genome()
+        present = genome["ontology_events"][0]["event_id"]
+        events = [make_event("first", ["gene3"]), make_event("second", ["gene4"]),
+                  make_event("third", ["gene5"])]
+        events[0]["event_id"] = present
+        output = self.add(copy.deepcopy(genome), events, incremental=1)
+        self.assertEqual([event["method"] for event in output["object"]["ontology_events"]],
+                         ["first", "second", "third"])
+        features = output["object"]["features"]
+        self.assertEqual(features[3]["ontology_terms"], {})
+        self.assertEqual(features[4]["ontology_terms"], {"EC": {"EC:1.1.1.1": [1]}})
+        self.assertEqual(features[5]["ontology_terms"], {"EC": {"EC:1.1.1.1": [2]}})
+
+    def test_incremental_alias_lookup_matches_full(self):
+        genome = self.annotated_genome()
+        genes = ["ABC1", "old2", "missing"]
+        full = self.add(copy.deepcopy(genome), [make_event("second", genes)])
+        incremental = self.add(copy.deepcopy(genome), [make_event("second", genes)], incremental=1)
+        # The full rebuild also counts gene0, found again for the event already present
+        self.assertEqual(full["ftrs_found"], 3)
+        self.assertEqual(incremental["ftrs_found"], 2)
+        self.assertEqual(full["ftrs_not_found"], ["missing"])
+        self.assertEqual(incremental["ftrs_not_found"], full["ftrs_not_found"])
+        self.assertEqual(incremental["object"], full["object"])
+        for output in [full, incremental]:
+            features = output["object"]["features"]
+            self.assertEqual(features[1]["ontology_terms"], {"EC": {"EC:1.1.1.1": [1]}})
+            self.assertEqual(features[2]["ontology_terms"], {"EC": {"EC:1.1.1.1": [1]}})
+        self.assertEqual(incremental["object"]["features"][1]["aliases"], [["locus", "ABC1"], ["Unknown", "old1"]])
+
+    def test_incremental_upgrades_a_raw_genome_as_full_does(self):
+        genome = make_genome()
+        genome["features"][1]["function"] = "Alcohol dehydrogenase; Kinase"
+        genome["features"][2].pop("md5")
+        genome["features"][3].pop("protein_translation")
+        events = [make_event("second", ["ABC1", "gene2", "gene4"])]
+        full = self.add(copy.deepcopy(genome), events)
+        incremental = self.add(copy.deepcopy(genome), events, incremental=1)
+        self.assertEqual(incremental, full)
+        features = incremental["object"]["features"]
+        self.assertEqual([ftr["id"] for ftr in features], ["gene0", "gene1", "gene2", "gene4", "gene5"])
+        self.assertEqual(features[1]["functions"], ["Alcohol dehydrogenase", "Kinase"])
+        self.assertNotIn("function", features[1])
+        self.assertEqual(features[1]["ontology_terms"], {"EC": {"EC:1.1.1.1": [0]}})
+        self.assertEqual(incremental["object"]["non_coding_features"][0]["id"], "gene3")
+        self.assertTrue(all(self.api.feature_upgraded(ftr, "features") for ftr in features))
+
+    def test_ama_string_aliases_are_found_by_full_string(self):
+        # Features of an AMA are never upgraded, so "source:ID" aliases stay whole strings
+        for incremental in [0, 1]:
+            features = [{"id": "gene" + str(index), "aliases": ["RefSeq:WP_" + str(index)]}
+                        for index in range(3)]
+            params = {"object": {"id": "ama", "ontology_events": []}, "feature_object": features,
+                      "type": "KBaseMetagenomes.AnnotatedMetagenomeAssembly", "save": 0,
+                      "incremental": incremental,
+                      "events": [make_event("second", ["RefSeq:WP_1", "WP_2"])]}
+            output = self.api.add_annotation_ontology_events(params)
+            self.assertEqual(output["ftrs_found"], 1)
+            self.assertEqual(output["ftrs_not_found"], ["WP_2"])
+            self.assertEqual(output["feature_object"][1]["ontology_terms"], {"EC": {"EC:1.1.1.1": [0]}})
+            self.assertEqual(output["feature_object"][1]["aliases"], ["RefSeq:WP_1"])
+
+
+class aliasIndexCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = AnnotationOntologyAPI({"data_directory": data_directory,
+                                          "feature_index_directory": self.directory})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def add(self, genes, incremental):
+        params = {"object": make_genome(), "type": "KBaseGenomes.Genome", "save": 0,
+                  "object_ref": "1/2/3", "events": [make_event("m" + str(len(genes)), genes)]}
+        if incremental:
+            params["incremental"] = 1
+        return self.api.add_annotation_ontology_events(params)
+
+    def assertCachedRun(self, first_incremental, second_incremental):
+        # The first add misses the cache and writes the index, the second reads it back
+        output = self.add(["ABC1"], first_incremental)
+        self.assertEqual(output["ftrs_not_found"], [])
+        cached = read_feature_index(self.directory, "1/2/3")
+        self.assertEqual(cached["ABC1"], ["gene1"])
+        self.assertEqual(cached["old1"], ["gene1"])
+        self.assertNotIn("locus:ABC1", cached)
+        output = self.add(["ABC2", "old3"], second_incremental)
+        self.assertEqual(output["ftrs_found"], 2)
+        self.assertEqual(output["ftrs_not_found"], [])
+        return cached
+
+    def test_index_is_the_same_whichever_mode_builds_it(self):
+        built = []
+        for (first, second) in [(True, False), (False, True), (True, True), (False, False)]:
+            built.append(self.assertCachedRun(first, second))
+            os.remove(feature_index_path(self.directory, "1/2/3"))
+        for cached in built[1:]:
+            self.assertEqual(cached, built[0])
+
+    def test_hit_uses_cached_index(self):
+        self.add(["ABC1"], True)
+        path = feature_index_path(self.directory, "1/2/3")
+        with gzip.open(path, "rt") as file:
+            index = json.load(file)
+        index["aliases"]["renamed"] = ["gene4"]
+        with gzip.open(path, "wt") as file:
+            json.dump(index, file)
+        for incremental in [True, False]:
+            self.assertEqual(self.add(["renamed"], incremental)["ftrs_not_found"], [])
+
+    def test_index_from_older_version_is_rebuilt(self):
+        self.add(["ABC1"], True)
+        path = feature_index_path(self.directory, "1/2/3")
+        with gzip.open(path, "rt") as file:
+            index = json.load(file)
+        index["version"] -= 1
+        index["aliases"] = {"locus:ABC1": ["gene1"]}
+        with gzip.open(path, "wt") as file:
+            json.dump(index, file)
+        self.assertIsNone(read_feature_index(self.directory, "1/2/3"))
+        self.assertEqual(self.add(["ABC1"], False)["ftrs_not_found"], [])
+        self.assertEqual(read_feature_index(self.directory, "1/2/3")["ABC1"], ["gene1"])
+
+
+class featureIndexEvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, ref, max_bytes):
+        write_feature_index(self.directory, ref, {"alias" + ref: ["gene" + str(index) for index in range(50)]},
+                            max_bytes=max_bytes)
+
+    def set_last_read(self, ref, seconds):
+        os.utime(feature_index_path(self.directory, ref), (seconds, seconds))
+
+    def test_least_recently_read_indexes_are_evicted(self):
+        for (index, ref) in enumerate(["1/1/1", "1/2/1", "1/3/1"]):
+            self.write(ref, None)
+            self.set_last_read(ref, 1000 + index)
+        size = os.path.getsize(feature_index_path(self.directory, "1/1/1"))
+        # Reading 1/1/1 makes 1/2/1 the least recently read
+        self.assertIsNotNone(read_feature_index(self.directory, "1/1/1"))
+        self.write("1/4/1", 3 * size + size // 2)
+        self.assertIsNone(read_feature_index(self.directory, "1/2/1"))
+        for ref in ["1/1/1", "1/3/1", "1/4/1"]:
+            self.assertIsNotNone(read_feature_index(self.directory, ref))
+        # The index just written is kept even when it alone exceeds the cap
+        self.write("1/5/1", 1)
+        self.assertEqual(os.listdir(self.directory), ["1_5_1.json.gz"])
+
+    def test_zero_size_disables_the_cache(self):
+        api = AnnotationOntologyAPI({"data_directory": data_directory, "feature_index_size": 0,
+                                     "feature_index_directory": self.directory})
+        api.add_annotation_ontology_events({"object": make_genome(), "type": "KBaseGenomes.Genome",
+                                            "save": 0, "object_ref": "1/2/3",
+                                            "events": [make_event("m", ["ABC1"])]})
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class mergeEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = AnnotationOntologyAPI({"data_directory": data_directory})
+
+    def events(self, *ids):
+        return [{"event_id": event_id.split("/")[0], "label": event_id} for event_id in ids]
+
+    def merge(self, events, new_events, overwrite_matching=False):
+        merged = self.api.merge_events(events, new_events, overwrite_matching)
+        return [event["label"] for event in merged]
+
+    def test_unmatched_events_are_appended_in_order(self):
+        self.assertEqual(self.merge(self.events("a", "b"), self.events("c", "d")), ["a", "b", "c", "d"])
+        self.assertEqual(self.merge([], self.events("c", "c/2")), ["c"])
+
+    def test_matching_events_are_dropped(self):
+        self.assertEqual(self.merge(self.events("a", "b"), self.events("b/new", "c")), ["a", "b", "c"])
+
+    def test_overwrite_replaces_first_match_in_place(self):
+        self.assertEqual(self.merge(self.events("a", "b", "c"), self.events("b/new"), True),
+                         ["a", "b/new", "c"])
+
+    def test_overwrite_removes_later_duplicates(self):
+        existing = self.events("a", "b/1", "c", "b/2", "d", "b/3")
+        self.assertEqual(self.merge(existing, self.events("b/new", "e"), True),
+                         ["a", "b/new", "c", "d", "e"])
+        # Without overwrite_matching duplicates already present are kept
+        existing = self.events("a", "b/1", "c", "b/2")
+        self.assertEqual(self.merge(existing, self.events("b/new")), ["a", "b/1", "c", "b/2"])
+
+    def test_overwrite_by_repeated_new_events_keeps_the_last(self):
+        self.assertEqual(self.merge(self.events("a", "b"), self.events("b/x", "b/y"), True),
+                         ["a", "b/y"])
+        self.assertEqual(self.merge(self.events("a"), self.events("b/x", "b/y"), True),
+                         ["a", "b/y"])
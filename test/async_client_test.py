@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from annotation_ontology_api.annotation_ontology_apiAsyncClient import annotation_ontology_api
+from annotation_ontology_api.baseclient import ServerError
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # A JSON-RPC stand-in for the service: echoes params back as the result
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        with server.lock:
+            server.ports.add(self.client_address[1])
+            server.calls.append(request)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failure = server.failures.pop(0) if server.failures else None
+        try:
+            if failure == "drop":
+                # The request was read, as if the service ran it, but no response is sent
+                self.close_connection = True
+            elif failure is not None:
+                self.respond(failure, {"error": {"name": "JSONRPCError", "code": -32000,
+                                                 "message": "failed", "error": "trace"}})
+            elif request["method"] == "annotation_ontology_api.status":
+                self.respond(200, {"version": "1.1", "id": request["id"],
+                                   "result": [{"state": "OK"}]}, chunked=True)
+            else:
+                threading.Event().wait(server.delay)
+                self.respond(200, {"version": "1.1", "id": request["id"],
+                                   "result": request["params"]})
+            if server.close_after_response:
+                # Closes the connection without announcing it, leaving the client a stale one
+                self.close_connection = True
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def respond(self, status, payload, chunked=False):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(body), 7):
+                chunk = body[start:start + 7]
+                self.wfile.write(("%x\r\n" % len(chunk)).encode("ascii") + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class asyncClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(("127.0.0.1", 0), StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.ports = set()
+        self.server.calls = []
+        self.server.failures = []
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.delay = 0
+        self.server.close_after_response = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:" + str(self.server.server_address[1])
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_client(self, coroutine_function, **kwargs):
+        async def run():
+            async with annotation_ontology_api(self.url, token="token", backoff=0.01, **kwargs) as client:
+                return await coroutine_function(client)
+        return self.loop.run_until_complete(run())
+
+    def test_concurrent_calls_share_bounded_pool(self):
+        self.server.delay = 0.02
+
+        async def fan_out(client):
+            return await asyncio.gather(*[
+                client.get_annotation_ontology_events({"input_ref": str(index)})
+                for index in range(200)])
+        results = self.run_client(fan_out, max_connections=8)
+        self.assertEqual(results, [{"input_ref": str(index)} for index in range(200)])
+        self.assertLessEqual(self.server.max_in_flight, 8)
+        self.assertLessEqual(len(self.server.ports), 8)
+        self.assertEqual(self.server.calls[0]["method"],
+                         "annotation_ontology_api.get_annotation_ontology_events")
+
+    def test_keep_alive_reuses_connection(self):
+        async def sequential(client):
+            for index in range(20):
+                await client.status()
+            return await client.status()
+        self.assertEqual(self.run_client(sequential), {"state": "OK"})
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_retries_unavailable_with_backoff(self):
+        self.server.failures = [503, 429]
+        result = self.run_client(lambda client: client.get_annotation_ontology_events({"x": 1}))
+        self.assertEqual(result, {"x": 1})
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.failures = [503] * 10
+        with self.assertRaises(ServerError) as context:
+            self.run_client(lambda client: client.status(), max_retries=2)
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_server_error_is_not_retried(self):
+        self.server.failures = [500]
+        with self.assertRaises(ServerError) as context:
+            self.run_client(lambda client: client.add_annotation_ontology_events({}))
+        self.assertEqual(context.exception.message, "failed")
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_bad_gateway_is_not_retried(self):
+        self.server.failures = [502, 504]
+        with self.assertRaises(ServerError) as context:
+            self.run_client(lambda client: client.add_annotation_ontology_events({}))
+        self.assertEqual(context.exception.code, 502)
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_lost_response_is_not_retried(self):
+        self.server.failures = ["drop"]
+        with self.assertRaises(ConnectionError):
+            self.run_client(lambda client: client.add_annotation_ontology_events({}))
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_stale_idle_connection_is_replaced(self):
+        self.server.close_after_response = True
+
+        async def sequential(client):
+            results = []
+            for index in range(3):
+                results.append(await client.add_annotation_ontology_events({"x": index}))
+                # Idle long enough for the server's close to reach the pooled connection
+                await asyncio.sleep(0.1)
+            return results
+        self.assertEqual(self.run_client(sequential), [{"x": 0}, {"x": 1}, {"x": 2}])
+        self.assertEqual(len(self.server.calls), 3)
+        self.assertEqual(len(self.server.ports), 3)
+
+    def test_pooled_connection_lost_after_sending_is_not_retried(self):
+        async def sequential(client):
+            await client.status()
+            self.server.failures = ["drop"]
+            await client.add_annotation_ontology_events({})
+        with self.assertRaises(ConnectionError):
+            self.run_client(sequential)
+        self.assertEqual(len(self.server.calls), 2)
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_failed_connect_is_retried(self):
+        attempts = []
+        open_connection = asyncio.open_connection
+
+        async def refuse_twice(*args, **kwargs):
+            attempts.append(args)
+            if len(attempts) <= 2:
+                raise ConnectionRefusedError()
+            return await open_connection(*args, **kwargs)
+        with mock.patch("asyncio.open_connection", new=refuse_twice):
+            self.assertEqual(self.run_client(lambda client: client.status()), {"state": "OK"})
+            self.assertEqual(len(attempts), 3)
+            del attempts[:]
+            with self.assertRaises(ConnectionRefusedError):
+                self.run_client(lambda client: client.status(), max_retries=1)
+        self.assertEqual(len(self.server.calls), 1)
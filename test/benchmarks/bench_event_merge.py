@@ -0,0 +1,53 @@
+"""
+Benchmark for merging new events into a genome's accumulated ontology events.
+
+Compares AnnotationOntologyAPI.merge_events against the linear scan it replaced, for
+genomes carrying hundreds of events from repeated annotation runs. Run from the module
+root:
+
+    PYTHONPATH=lib python test/benchmarks/bench_event_merge.py
+"""
+import os
+import sys
+import timeit
+
+from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+
+
+def linear_merge(events, new_events, overwrite_matching):
+    # The scan previously inlined in add_annotation_ontology_events
+    for event in new_events:
+        index = 0
+        match = 0
+        for existing_event in events:
+            if existing_event["event_id"] == event["event_id"]:
+                match = 1
+                if overwrite_matching:
+                    events[index] = event
+            index += 1
+        if match == 0:
+            events.append(event)
+    return events
+
+
+def make_events(count, offset=0):
+    return [{"event_id": "RAST:SSO:run" + str(offset + index)} for index in range(count)]
+
+
+def main():
+    api = AnnotationOntologyAPI({"data_directory": data_directory})
+    print("existing\tnew\tlinear_ms\tindexed_ms")
+    for existing, new in [(100, 10), (500, 50), (1000, 200), (5000, 1000)]:
+        # Half of the new events overwrite existing ones, half are appended
+        new_events = make_events(new // 2, existing - new // 2) + make_events(new - new // 2, existing)
+        number = max(1, 2000 // existing)
+        linear = timeit.timeit(lambda: linear_merge(make_events(existing), new_events, True), number=number)
+        indexed = timeit.timeit(lambda: api.merge_events(make_events(existing), new_events, True), number=number)
+        assert linear_merge(make_events(existing), new_events, True) == api.merge_events(make_events(existing), new_events, True)
+        print("%d\t%d\t%.3f\t%.3f" % (existing, new, 1000 * linear / number, 1000 * indexed / number))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Benchmark for filtered get_annotation_ontology_events calls.
+
+Builds synthetic genomes of growing size, each with ten annotation events, and times an
+unfiltered call against calls filtered to five genes and to one event. The gene query only
+does term work for its five genes, leaving the one pass that indexes the features; the
+event query still reads feature term lists but skips normalizing and translating the
+other events' terms. Run from the module root:
+
+    PYTHONPATH=lib python test/benchmarks/bench_query_events.py
+"""
+import os
+import random
+import sys
+import timeit
+
+from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+
+event_count = 10
+
+
+def make_genome(feature_count):
+    generator = random.Random(feature_count)
+    events = []
+    for index in range(event_count):
+        events.append({"id": "EC", "method": "method" + str(index), "method_version": "1",
+                       "timestamp": "2020", "event_id": "event" + str(index)})
+    features = []
+    for index in range(feature_count):
+        terms = {}
+        for event_index in generator.sample(range(event_count), 3):
+            term = "EC:%d.%d.%d.%d" % (generator.randint(1, 6), generator.randint(1, 20),
+                                        generator.randint(1, 20), generator.randint(1, 200))
+            terms.setdefault(term, []).append(event_index)
+        features.append({"id": "gene" + str(index), "ontology_terms": {"EC": terms}})
+    return {"ontology_events": events, "features": features}
+
+
+def main():
+    api = AnnotationOntologyAPI({"data_directory": data_directory})
+    api.get_alias_hash("EC")
+    print("features\tall_ms\tfive_genes_ms\tone_event_ms")
+    for feature_count in [1000, 10000, 100000]:
+        genome = make_genome(feature_count)
+        queries = [{}, {"query_genes": ["gene1", "gene10", "gene100", "gene500", "gene999"]},
+                   {"query_events": ["event3"]}]
+        timings = []
+        for query in queries:
+            params = dict(query, object=genome, type="KBaseGenomes.Genome")
+            number = max(1, 20000 // feature_count)
+            seconds = timeit.timeit(lambda: api.get_annotation_ontology_events(dict(params)), number=number)
+            timings.append(1000 * seconds / number)
+        print("%d\t%.2f\t%.2f\t%.2f" % tuple([feature_count] + timings))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+Benchmark for the server's JSON serializers on large get_annotation_ontology_events responses.
+
+Builds the response the server sends for synthetic genomes of growing size and times
+encoding it, as JSONRPCServiceCustom.call does, and decoding it back with every serializer
+installed. The json serializer is the standard library encoder the server used before.
+Run from the module root:
+
+    PYTHONPATH=lib python test/benchmarks/bench_serialization.py
+"""
+import sys
+import timeit
+
+from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+from annotation_ontology_api.serialization import get_serializer, orjson
+
+from bench_query_events import data_directory, make_genome
+
+
+def main():
+    api = AnnotationOntologyAPI({"data_directory": data_directory})
+    api.get_alias_hash("EC")
+    serializers = [get_serializer("json")]
+    if orjson is not None:
+        serializers.append(get_serializer("orjson"))
+    columns = ["features", "mb"]
+    for serializer in serializers:
+        columns += [serializer.name + "_dumps_ms", serializer.name + "_loads_ms"]
+    print("\t".join(columns))
+    for feature_count in [10000, 100000, 300000]:
+        output = api.get_annotation_ontology_events({"object": make_genome(feature_count),
+                                                     "type": "KBaseGenomes.Genome"})
+        response = {"version": "1.1", "id": "1", "result": [output]}
+        encoded = serializers[0].dumps(response)
+        number = max(1, 300000 // feature_count)
+        timings = [len(encoded) / 1e6]
+        for serializer in serializers:
+            seconds = timeit.timeit(lambda: serializer.dumps(response), number=number)
+            timings.append(1000 * seconds / number)
+            seconds = timeit.timeit(lambda: serializer.loads(encoded), number=number)
+            timings.append(1000 * seconds / number)
+        print("%d\t" % feature_count + "\t".join("%.2f" % timing for timing in timings))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+from annotation_ontology_api.event_table import EVENT_TABLE_COLUMNS, EventTableWriter, pyarrow
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+genome = {
+    "ontology_events": [
+        {"id": "EC", "method": "m", "method_version": "1", "timestamp": "2020", "event_id": "ec"},
+        {"id": "KO", "method": "m", "method_version": "1", "timestamp": "2020", "event_id": "ko"}],
+    "features": [
+        {"id": "gene1", "ontology_terms": {"EC": {"1.1.1.1": [0], "EC:2.7.1.1": [0]}, "KO": {"K00001": [1]}},
+         "ontology_evidence": {"1.1.1.1": {0: {"scores": {"probability": 0.9}}}}},
+        {"id": "gene2", "ontology_terms": {"EC": {"1.1.1.1": [0]}}}],
+    "cdss": [{"id": "gene2_CDS", "ontology_terms": {"KO": {"K00001": [1]}}}]
+}
+
+
+def read_table(path, format):
+    if format == "parquet":
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path)
+    import pyarrow.ipc
+    return pyarrow.ipc.open_file(path).read_all()
+
+
+class eventTableTest(unittest.TestCase):
+
+    def setUp(self):
+        if pyarrow is None:
+            self.skipTest("pyarrow is not installed")
+        self.directory = tempfile.mkdtemp()
+        self.api = AnnotationOntologyAPI({"data_directory": data_directory, "scratch": self.directory})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def expected_rows(self):
+        output = self.api.get_annotation_ontology_events({"object": copy.deepcopy(genome),
+                                                          "type": "KBaseGenomes.Genome"})
+        rows = []
+        for event in output["events"]:
+            for feature_id in event["ontology_terms"]:
+                for term in event["ontology_terms"][feature_id]:
+                    evidence = term.get("evidence")
+                    rows.append((event["event_id"], event["ontology_id"], feature_id,
+                                 output["feature_types"][feature_id], term["term"],
+                                 term.get("modelseed_ids", []),
+                                 None if evidence is None else json.dumps(evidence)))
+        return sorted(rows, key=repr)
+
+    def test_export_round_trips_rows(self):
+        expected = self.expected_rows()
+        self.assertEqual(len(expected), 5)
+        for format in ["parquet", "arrow"]:
+            output = self.api.export_annotation_ontology_events({
+                "object": copy.deepcopy(genome), "type": "KBaseGenomes.Genome", "format": format,
+                "output_name": "events"})
+            self.assertEqual(output["file_path"], self.directory + "/events." + format)
+            self.assertEqual(output["row_count"], len(expected))
+            table = read_table(output["file_path"], format)
+            self.assertEqual(table.column_names, EVENT_TABLE_COLUMNS)
+            columns = table.to_pydict()
+            rows = sorted(zip(*[columns[column] for column in EVENT_TABLE_COLUMNS]), key=repr)
+            self.assertEqual(rows, expected)
+
+    def test_writer_batches_rows(self):
+        path = self.directory + "/batched.parquet"
+        writer = EventTableWriter(path, "parquet", batch_rows=3)
+        for index in range(5):
+            writer.add({"event_id": "e" + str(index), "ontology_id": "EC"},
+                       {"gene1": [{"term": "EC:1.1.1.1", "evidence": {"score": index}}],
+                        "gene2": [{"term": "EC:2.7.1.1", "modelseed_ids": ["rxn00001"]}]},
+                       {"gene1": "gene", "gene2": "cds"})
+        self.assertEqual(writer.close(), 10)
+        columns = read_table(path, "parquet").to_pydict()
+        self.assertEqual(len(columns["term"]), 10)
+        self.assertEqual(columns["evidence"][:2], ['{"score": 0}', None])
+        self.assertEqual(columns["modelseed_ids"][:2], [[], ["rxn00001"]])
+
+    def test_rejects_bad_format_and_output_name(self):
+        for params in [{"format": "csv"}, {"output_name": "../escape"},
+                       {"output_name": "a/b"}, {"output_name": ".hidden"}, {"output_name": ""}]:
+            params.update({"object": copy.deepcopy(genome), "type": "KBaseGenomes.Genome"})
+            with self.assertRaises(ValueError):
+                self.api.export_annotation_ontology_events(params)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_failed_export_removes_the_file_and_raises_the_original_error(self):
+        def iterate(params):
+            yield {"event_id": "e", "ontology_id": "EC"}, {"gene1": [{"term": "EC:1.1.1.1"}]}, {"gene1": "gene"}
+            raise RuntimeError("workspace went away")
+        params = {"object": copy.deepcopy(genome), "type": "KBaseGenomes.Genome", "output_name": "failed"}
+        with mock.patch.object(self.api, "iterate_annotation_ontology_events", iterate):
+            with self.assertRaisesRegex(RuntimeError, "workspace went away"):
+                self.api.export_annotation_ontology_events(params)
+            self.assertEqual(os.listdir(self.directory), [])
+            with mock.patch.object(EventTableWriter, "close", side_effect=IOError("disk full")):
+                with self.assertRaisesRegex(RuntimeError, "workspace went away"):
+                    self.api.export_annotation_ontology_events(params)
+        self.assertEqual(os.listdir(self.directory), [])
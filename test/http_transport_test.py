@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+import Workspace.baseclient
+from annotation_ontology_api import http_transport
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    # A keep-alive JSON-RPC stand-in that echoes params back as the result
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        with self.server.lock:
+            self.server.ports.add(self.client_address[1])
+        body = json.dumps({"version": "1.1", "id": request["id"], "result": request["params"]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class EchoServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class httpTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EchoServer(("127.0.0.1", 0), EchoHandler)
+        self.server.lock = threading.Lock()
+        self.server.ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:" + str(self.server.server_address[1])
+        http_transport.use_pooled_transport(Workspace.baseclient)
+
+    def tearDown(self):
+        Workspace.baseclient._requests = requests
+        http_transport.configure_transport(10, 10)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def call(self, index):
+        client = Workspace.baseclient.BaseClient(self.url, token="token")
+        return client.call_method("Workspace.echo", [{"x": index}])
+
+    def test_generated_client_reuses_connections(self):
+        self.assertEqual([self.call(index) for index in range(20)], [{"x": index} for index in range(20)])
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_max_per_host_bounds_connections(self):
+        http_transport.configure_transport(max_per_host=3)
+        threads = [threading.Thread(target=self.call, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(len(self.server.ports), 3)
+
+    def test_configure_transport_closes_the_previous_session(self):
+        session = http_transport.get_session()
+        with mock.patch.object(session, "close") as close:
+            http_transport.configure_transport(pool_size=5)
+        close.assert_called_once_with()
+        self.assertIsNot(http_transport.get_session(), session)
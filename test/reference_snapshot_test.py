@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from annotation_ontology_api.reference_data import (AliasTable, ReferenceData, build_snapshot,
+                                                    convert_role_to_searchrole, dictionary_types,
+                                                    namespace_files)
+from annotation_ontology_api.snapshot import SNAPSHOT_FILENAME, Snapshot
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def raw_tables(reference):
+    # Every table straight from the reference files, as plain dicts, without the snapshot
+    # or AliasTable in the way
+    msrxn = dict(reference.iterate_json("msrxn_hash.json"))
+    loaders = {"EC": reference.load_ec_aliases, "KO": reference.load_ko_aliases,
+               "SSO": reference.load_sso_aliases, "GO": reference.load_go_aliases,
+               "META": reference.load_reaction_aliases}
+    tables = {"alias:MSRXN": msrxn}
+    for namespace in loaders:
+        if os.path.exists(reference.data_directory + "/" + namespace_files[namespace]):
+            for name, table in loaders[namespace](msrxn).items():
+                tables["alias:" + name] = table
+    for type in dictionary_types:
+        if os.path.exists(reference.data_directory + "/" + type + "_dictionary.json"):
+            names = {}
+            synonyms = {}
+            for term, data in reference.iterate_json(type + "_dictionary.json", ["term_hash"]):
+                names[term] = data["name"]
+                if len(data.get("synonyms", [])) > 0:
+                    synonyms[term] = data["synonyms"]
+            tables["names:" + type] = names
+            tables["synonyms:" + type] = synonyms
+    if os.path.exists(reference.data_directory + "/SSO_dictionary.json"):
+        tables["seed_roles"] = {}
+        for term, data in reference.iterate_json("SSO_dictionary.json", ["term_hash"]):
+            tables["seed_roles"][convert_role_to_searchrole(data["name"])] = term
+    return tables
+
+
+class referenceSnapshotTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The snapshot is built from a copy so the shipped one is never touched
+        cls.directory = tempfile.mkdtemp()
+        cls.data_directory = cls.directory + "/data"
+        shutil.copytree(data_directory, cls.data_directory,
+                        ignore=shutil.ignore_patterns(SNAPSHOT_FILENAME))
+        cls.snapshot_path = cls.data_directory + "/" + SNAPSHOT_FILENAME
+        build_snapshot(cls.data_directory, cls.snapshot_path)
+        cls.raw = raw_tables(ReferenceData(cls.data_directory))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_snapshot_matches_reference_files(self):
+        snapshot = Snapshot(self.snapshot_path)
+        self.assertEqual(sorted(snapshot.tables), sorted(self.raw))
+        for name in self.raw:
+            table = snapshot.tables[name]
+            self.assertEqual(len(table), len(self.raw[name]), name)
+            self.assertEqual(dict(table.items()), self.raw[name], name)
+        self.assertNotIn("no such term", snapshot.tables["names:EC"])
+
+    def test_alias_tables_match_reference_files(self):
+        reference = ReferenceData(self.data_directory)
+        for name in self.raw:
+            if name.startswith("alias:"):
+                table = reference.get_alias_hash(name[6:])
+                self.assertIsInstance(table, AliasTable)
+                self.assertEqual(list(table), sorted(self.raw[name]), name)
+                self.assertEqual(dict(table.items()), self.raw[name], name)
+
+    def test_stale_snapshot_is_rebuilt(self):
+        directory = tempfile.mkdtemp()
+        try:
+            snapshot_path = directory + "/" + SNAPSHOT_FILENAME
+            shutil.copy(self.snapshot_path, snapshot_path)
+            shutil.copy(self.data_directory + "/EC_translation.tsv", directory + "/EC_translation.tsv.orig")
+            built = os.stat(snapshot_path).st_mtime_ns
+            snapshot = ReferenceData(self.data_directory, snapshot_path).get_snapshot()
+            self.assertNotIn("EC:9.9.9.9", snapshot.tables["alias:EC"])
+            # Touching a file without changing it keeps the snapshot
+            os.utime(self.data_directory + "/EC_translation.tsv", (1, 1))
+            ReferenceData(self.data_directory, snapshot_path).get_snapshot()
+            self.assertEqual(os.stat(snapshot_path).st_mtime_ns, built)
+            with open(self.data_directory + "/EC_translation.tsv", "a") as file:
+                file.write("rxn00001\t9.9.9.9\tEnzyme Class\n")
+            reference = ReferenceData(self.data_directory, snapshot_path)
+            rebuilt = reference.get_snapshot()
+            self.assertNotEqual(rebuilt.checksum, snapshot.checksum)
+            self.assertEqual(reference.get_alias_hash("EC")["EC:9.9.9.9"],
+                             self.raw["alias:MSRXN"].get("MSRXN:rxn00001", ["MSRXN:rxn00001"])[:1])
+            self.assertEqual(reference.loaded_namespaces()["alias:EC"]["source"], "snapshot")
+        finally:
+            shutil.copy(directory + "/EC_translation.tsv.orig", self.data_directory + "/EC_translation.tsv")
+            shutil.rmtree(directory)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import glob
+import json
+import os
+import random
+import re
+import sys
+import unittest
+
+from annotation_ontology_api.reference_data import convert_role_to_searchrole
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def reference_searchrole(term):
+    # The original six-pass normalizer that convert_role_to_searchrole must reproduce
+    term = term.lower()
+    term = re.sub(r"\s", "", term)
+    term = re.sub(r"[\d\-]+\.[\d\-]+\.[\d\-]+\.[\d\-]*", "", term)
+    term = re.sub(r"\#.*$", "", term)
+    term = re.sub(r"\(ec:*\)", "", term)
+    term = re.sub(r"[\(\)\[\],-]", "", term)
+    return term
+
+
+class searchroleTest(unittest.TestCase):
+
+    def assertParity(self, terms):
+        # Bypassing the memo so every term exercises the normalizer itself
+        normalizer = convert_role_to_searchrole.__wrapped__
+        for term in terms:
+            self.assertEqual(normalizer(term), reference_searchrole(term), repr(term))
+
+    def test_whitespace_matches_regex(self):
+        # The normalizer strips whitespace with str.split(), which must agree with \s
+        pattern = re.compile(r"\s")
+        for code in range(sys.maxunicode + 1):
+            character = chr(code)
+            self.assertEqual(character.isspace(), pattern.match(character) is not None,
+                             hex(code))
+
+    def test_dictionary_names(self):
+        # Every term name shipped with the module, including the full SSO dictionary
+        # when it is present in the data directory
+        filenames = glob.glob(os.path.join(data_directory, "*_dictionary.json"))
+        self.assertTrue(len(filenames) > 0)
+        for filename in filenames:
+            with open(filename) as json_file:
+                ontology = json.load(json_file)
+            names = []
+            for term in ontology["term_hash"].values():
+                names.append(term["name"])
+                names.extend(term.get("synonyms", []))
+            self.assertParity(names)
+
+    def test_edge_cases(self):
+        self.assertParity([
+            "",
+            "Alcohol dehydrogenase (EC 1.1.1.1)",
+            "Alcohol dehydrogenase (EC:1.1.1.1)",
+            "Alcohol dehydrogenase (EC 1.1.1.-) # frameshift",
+            "Protein (ec:) [putative], 2-component",
+            "(EC 1.2.3.4)(EC 5.6.7.-)",
+            "(ec::1.2.3.4::2.3.4.5)",
+            "(e c:1.1.1.1)",
+            "1.2.3 . 4 domain",
+            "--.--.--.-- role",
+            "Role #1 (EC 1.1.1.1)",
+            "Role with unicode\x1cspaces　",
+            "İstanbul (EC 1.1.1.1)",
+            "Role with digits ١.٢.٣.٤",
+        ])
+
+    def test_random_strings(self):
+        alphabet = ["a", "b", "E", "e", "C", "c", ":", "1", "2", "-", ".", "#", "(", ")",
+                    "[", "]", ",", " ", "\t", "\n", " ", "٣", "İ"]
+        generator = random.Random(8)
+        terms = []
+        for _ in range(20000):
+            length = generator.randint(0, 24)
+            terms.append("".join(generator.choice(alphabet) for _ in range(length)))
+        self.assertParity(terms)
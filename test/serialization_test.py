@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from annotation_ontology_api.serialization import JSONObjectEncoder, get_serializer, orjson
+
+
+class Roles(object):
+    # Stands in for the objects with a toJSONable method the server encodes
+    def __init__(self, roles):
+        self.roles = roles
+
+    def toJSONable(self):
+        return {"roles": self.roles}
+
+
+class serializationTest(unittest.TestCase):
+
+    def serializers(self):
+        names = ["json"] if orjson is None else ["json", "orjson"]
+        return [get_serializer(name) for name in names]
+
+    def test_matches_json_object_encoder(self):
+        value = {"result": [{"events": [{"event_id": "SSO:1", "terms": frozenset(["b"]),
+                                         "roles": Roles([1, 2]), 3: None}],
+                             "ids": set(["a"]), "name": "é", "nested": [[1.5, True]]}]}
+        expected = json.loads(json.dumps(value, cls=JSONObjectEncoder))
+        for serializer in self.serializers():
+            encoded = serializer.dumps(value)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(serializer.loads(encoded), expected)
+            self.assertEqual(json.loads(encoded.decode("utf-8")), expected)
+
+    def test_wide_integers_fall_back(self):
+        for serializer in self.serializers():
+            self.assertEqual(serializer.loads(serializer.dumps([2 ** 70])), [2 ** 70])
+
+    def test_unserializable_raises(self):
+        for serializer in self.serializers():
+            with self.assertRaises(TypeError):
+                serializer.dumps({"x": object()})
+
+    def test_decodes_bytes_and_rejects_bad_json(self):
+        for serializer in self.serializers():
+            self.assertEqual(serializer.loads(b'{"method": "m", "params": [{}]}'),
+                             {"method": "m", "params": [{}]})
+            with self.assertRaises(ValueError):
+                serializer.loads(b'{"method": ')
+
+    def test_unknown_serializer(self):
+        with self.assertRaises(ValueError):
+            get_serializer("simplejson")
+        self.assertEqual(get_serializer().name, "json" if orjson is None else "orjson")
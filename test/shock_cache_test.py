@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from annotation_ontology_api.shock_cache import ShockCache
+
+
+class shockCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ShockCache(self.directory + "/cache", 100)
+        self.downloads = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def downloader(self, content):
+        # Stands in for DataFileUtil.shock_to_file, writing content into the given directory
+        def download(directory):
+            self.downloads.append(content)
+            path = directory + "/download"
+            with open(path, "wb") as file:
+                file.write(content)
+            return path
+        return download
+
+    def read(self, handle_id, content=b"x" * 40):
+        with self.cache.open(handle_id, self.downloader(content)) as file:
+            return file.read()
+
+    def set_last_read(self, handle_id, seconds):
+        os.utime(self.cache.path(handle_id) + ".json", (seconds, seconds))
+
+    def test_miss_downloads_and_hit_reuses(self):
+        self.assertEqual(self.read("KBH_1", b"features"), b"features")
+        self.assertEqual(self.read("KBH_1", b"changed"), b"features")
+        self.assertEqual(self.downloads, [b"features"])
+        self.assertEqual(self.read("KBH_2", b"other"), b"other")
+        self.assertEqual(len(self.downloads), 2)
+
+    def test_corrupted_entry_is_downloaded_again(self):
+        self.read("KBH_1", b"features")
+        with open(self.cache.path("KBH_1"), "wb") as file:
+            file.write(b"truncated")
+        self.assertEqual(self.read("KBH_1", b"features"), b"features")
+        with open(self.cache.path("KBH_1") + ".json", "w") as file:
+            file.write('{"handle_id": "KBH_2", "size": 8')
+        self.assertEqual(self.read("KBH_1", b"features"), b"features")
+        self.assertEqual(len(self.downloads), 3)
+
+    def test_least_recently_read_is_evicted(self):
+        for (seconds, handle_id) in enumerate(["KBH_1", "KBH_2"]):
+            self.read(handle_id)
+            self.set_last_read(handle_id, 1000 + seconds)
+        # Reading KBH_1 again makes KBH_2 the least recently read
+        self.read("KBH_1")
+        self.read("KBH_3")
+        self.assertTrue(os.path.exists(self.cache.path("KBH_1")))
+        self.assertFalse(os.path.exists(self.cache.path("KBH_2")))
+        self.assertFalse(os.path.exists(self.cache.path("KBH_2") + ".json"))
+        self.assertTrue(os.path.exists(self.cache.path("KBH_3")))
+        self.assertEqual(len(self.downloads), 3)
+
+    def test_open_file_survives_eviction(self):
+        file = self.cache.open("KBH_1", self.downloader(b"a" * 60))
+        with file:
+            self.read("KBH_2", b"b" * 60)
+            self.assertFalse(os.path.exists(self.cache.path("KBH_1")))
+            self.assertEqual(file.read(), b"a" * 60)
+
+    def test_evicted_before_open_is_downloaded_once_more(self):
+        open_entry = self.cache.open_entry
+        evictions = []
+
+        def evicted_once(handle_id):
+            # Another process evicts the file between it being added and opened
+            if len(self.downloads) == 1 and not evictions:
+                evictions.append(handle_id)
+                self.cache.remove(self.cache.path(handle_id))
+            return open_entry(handle_id)
+        self.cache.open_entry = evicted_once
+        self.assertEqual(self.read("KBH_1", b"features"), b"features")
+        self.assertEqual(len(self.downloads), 2)
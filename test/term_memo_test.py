@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+from annotation_ontology_api.annotation_ontology_api import AnnotationOntologyAPI
+from annotation_ontology_api.reference_data import SNAPSHOT_FILENAME, ReferenceData, TermMemo
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def make_genome(terms):
+    # Every feature carries every term, so all but the first sighting of a term repeat it
+    events = [{"id": "EC", "method": "m", "method_version": "1", "timestamp": "2020",
+               "event_id": "event"}]
+    features = [{"id": "gene" + str(index), "ontology_terms": {"EC": {term: [0] for term in terms}}}
+                for index in range(4)]
+    return {"ontology_events": events, "features": features}
+
+
+class termMemoTest(unittest.TestCase):
+
+    def make_api(self, term_memo_size=0):
+        api = AnnotationOntologyAPI({"data_directory": data_directory,
+                                     "term_memo_size": term_memo_size})
+        # A private ReferenceData keeps the counts and shared memo of other tests out
+        api.reference_data = ReferenceData(data_directory, data_directory + "/" + SNAPSHOT_FILENAME)
+        return api
+
+    def get(self, api, terms, chunk_size=5000):
+        params = {"object": make_genome(terms), "type": "KBaseGenomes.Genome"}
+        return list(api.iterate_annotation_ontology_events(params, chunk_size))
+
+    def test_repeated_terms_count_as_hits(self):
+        api = self.make_api()
+        self.get(api, ["1.1.1.1", "EC:2.7.1.1"])
+        self.assertEqual(api.reference_data.term_memo_report(), {"hits": 6, "misses": 2})
+        # The per-request memo is not kept: a second request misses again
+        self.get(api, ["1.1.1.1", "EC:2.7.1.1"], chunk_size=1)
+        self.assertEqual(api.reference_data.term_memo_report(), {"hits": 12, "misses": 4})
+
+    def test_shared_memo_carries_across_requests(self):
+        api = self.make_api(10)
+        first = self.get(api, ["1.1.1.1", "EC:2.7.1.1"])
+        second = self.get(api, ["1.1.1.1", "EC:2.7.1.1"])
+        self.assertEqual(first, second)
+        self.assertEqual(api.reference_data.term_memo_report(),
+                         {"hits": 14, "misses": 2, "terms": 2, "max_size": 10})
+
+    def test_shared_memo_evicts_at_term_memo_size(self):
+        api = self.make_api(3)
+        self.get(api, ["1.1.1." + str(index) for index in range(5)])
+        report = api.reference_data.term_memo_report()
+        self.assertEqual(report["terms"], 3)
+        self.assertEqual(list(api.reference_data.term_memo.terms),
+                         [("EC", "1.1.1." + str(index)) for index in range(2, 5)])
+
+    def test_least_recently_used_is_evicted(self):
+        memo = TermMemo(2)
+        memo.put("a", ("A", []))
+        memo.put("b", ("B", []))
+        self.assertEqual(memo.get("a"), ("A", []))
+        memo.put("c", ("C", []))
+        self.assertIsNone(memo.get("b"))
+        self.assertEqual(list(memo.terms), ["a", "c"])
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import importlib
+import io
+import json
+import sys
+import types
+import unittest
+
+SERVER_MODULE = "annotation_ontology_api.annotation_ontology_apiServer"
+
+
+class JSONRPCError(Exception):
+    def __init__(self, code, message, data):
+        super(JSONRPCError, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+class StandInImpl(object):
+    # The Impl methods wsgi.py reaches through the generated server
+
+    def iterate_annotation_ontology_events(self, ctx, params):
+        for index in range(params["chunks"]):
+            yield {"event": {"event_id": "e"}, "ontology_terms": {"gene" + str(index): []},
+                   "feature_types": {"gene" + str(index): "gene"}}
+        if params.get("fail"):
+            raise ValueError("feature file went away")
+
+    def get_annotation_ontology_events(self, ctx, params):
+        if params.get("fail"):
+            raise JSONRPCError(-32000, "Server error", "no such object")
+        return [{"events": [], "ids": set(["a"]), "user": ctx["user_id"]}]
+
+
+class StandInRPCService(object):
+    # call_py as jsonrpcbase runs it: the method's result list wrapped in a response
+    def __init__(self, methods):
+        self.methods = methods
+
+    def call_py(self, ctx, request):
+        result = self.methods[request["method"]](ctx, *request["params"])
+        return {"version": "1.1", "result": result, "id": request["id"]}
+
+
+class StandInApplication(object):
+    # The generated Application, reduced to what wsgi.py uses
+
+    def __init__(self, impl):
+        self.userlog = None
+        self.logged = []
+        self.generated_calls = 0
+        self.method_authentication = {
+            "annotation_ontology_api.get_annotation_ontology_events": "optional",
+            "annotation_ontology_api.add_annotation_ontology_events": "required"}
+        self.auth_client = types.SimpleNamespace(get_user=lambda token: "user_" + token)
+        self.rpc_service = StandInRPCService({
+            "annotation_ontology_api.get_annotation_ontology_events": impl.get_annotation_ontology_events})
+
+    def __call__(self, environ, start_response):
+        self.generated_calls += 1
+        start_response("500 Internal Server Error", [("content-type", "application/json")])
+        return [json.dumps({"error": {"name": "generated"}}).encode("utf-8")]
+
+    def log(self, level, context, message):
+        self.logged.append((level, message))
+
+    def now_in_utc(self):
+        return "2020-01-01T00:00:00+00:00"
+
+    def process_error(self, error, context, request, trace=None):
+        error["id"] = request["id"]
+        error["version"] = "1.1"
+        error["error"]["error"] = trace
+        return json.dumps(error)
+
+
+def stand_in_server():
+    server = types.ModuleType(SERVER_MODULE)
+    server.config = None
+    server.impl_annotation_ontology_api = StandInImpl()
+    server.application = StandInApplication(server.impl_annotation_ontology_api)
+    server.MethodContext = lambda logger: {"user_id": None, "authenticated": None}
+    server.getIPAddress = lambda environ: environ.get("REMOTE_ADDR")
+    server.log = types.SimpleNamespace(INFO=6, ERR=3)
+    server.JSONRPCError = JSONRPCError
+    return server
+
+
+class wsgiTest(unittest.TestCase):
+
+    def setUp(self):
+        # wsgi.py is loaded against a stand-in for the generated server, which is not
+        # importable outside the service image
+        self.saved = {name: sys.modules.get(name)
+                      for name in [SERVER_MODULE, "annotation_ontology_api.wsgi"]}
+        self.server = stand_in_server()
+        sys.modules[SERVER_MODULE] = self.server
+        sys.modules.pop("annotation_ontology_api.wsgi", None)
+        self.wsgi = importlib.import_module("annotation_ontology_api.wsgi")
+
+    def tearDown(self):
+        for name in self.saved:
+            if self.saved[name] is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = self.saved[name]
+
+    def request(self, method, params, accept=None, token=None, body=None):
+        if body is None:
+            body = json.dumps({"version": "1.1", "id": "12", "method": "annotation_ontology_api." + method,
+                               "params": [params]}).encode("utf-8")
+        environ = {"REQUEST_METHOD": "POST", "CONTENT_LENGTH": str(len(body)),
+                   "wsgi.input": io.BytesIO(body), "REMOTE_ADDR": "127.0.0.1"}
+        if accept is not None:
+            environ["HTTP_ACCEPT"] = accept
+        if token is not None:
+            environ["HTTP_AUTHORIZATION"] = token
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+        response["body"] = b"".join(self.wsgi.application(environ, start_response))
+        return response
+
+    def test_streaming_request_returns_one_line_per_chunk(self):
+        response = self.request("get_annotation_ontology_events", {"chunks": 3},
+                                accept="application/x-ndjson")
+        self.assertEqual(response["status"], "200 OK")
+        self.assertEqual(response["headers"]["content-type"], "application/x-ndjson")
+        lines = response["body"].split(b"\n")
+        self.assertEqual(lines[-1], b"")
+        lines = [json.loads(line) for line in lines[:-1]]
+        self.assertEqual([list(line["ontology_terms"]) for line in lines], [["gene0"], ["gene1"], ["gene2"]])
+
+    def test_failure_mid_stream_ends_with_an_error_line(self):
+        response = self.request("get_annotation_ontology_events", {"chunks": 2, "fail": True},
+                                accept="application/x-ndjson")
+        lines = [json.loads(line) for line in response["body"].splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertIn("ontology_terms", lines[1])
+        self.assertEqual(lines[2]["error"]["name"], "Unexpected Server Error")
+        self.assertIn("feature file went away", lines[2]["error"]["error"])
+        self.assertEqual(self.server.application.logged[-1][0], self.server.log.ERR)
+
+    def test_plain_request_returns_a_json_rpc_body(self):
+        response = self.request("get_annotation_ontology_events", {"chunks": 3}, token="abc")
+        self.assertEqual(response["status"], "200 OK")
+        self.assertEqual(response["headers"]["content-type"], "application/json")
+        self.assertEqual(int(response["headers"]["content-length"]), len(response["body"]))
+        self.assertEqual(json.loads(response["body"].decode("utf-8")),
+                         {"version": "1.1", "id": "12", "result": [{"events": [], "ids": ["a"], "user": "user_abc"}]})
+        self.assertEqual(self.server.application.generated_calls, 0)
+
+    def test_method_error_is_reported_as_the_generated_server_does(self):
+        response = self.request("get_annotation_ontology_events", {"fail": True})
+        self.assertEqual(response["status"], "500 Internal Server Error")
+        self.assertEqual(int(response["headers"]["content-length"]), len(response["body"]))
+        error = json.loads(response["body"].decode("utf-8"))
+        self.assertEqual(error["id"], "12")
+        self.assertEqual(error["error"]["message"], "no such object")
+
+    def test_requests_it_cannot_start_go_to_the_generated_application(self):
+        for response in [self.request("add_annotation_ontology_events", {}),
+                         self.request(None, None, body=b"{not json"),
+                         self.request(None, None, body=b"[]")]:
+            self.assertEqual(json.loads(response["body"].decode("utf-8")), {"error": {"name": "generated"}})
+        self.assertEqual(self.server.application.generated_calls, 3)